@@ -1,43 +1,109 @@
+import os
+import sys
 import cv2
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from camera import open_camera
+from vision import hsv_ranges_from_pixels, save_color_profile
+
+# demo.py loads this file at startup, saved profiles replace its COLOR_RANGE entries
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "color_profiles.json")
+# tune with the same exposure / white balance locks as demo.py, or the ranges won't match there
+LOCK_EXPOSURE = False
+LOCK_WHITE_BALANCE = False
+
+# Hover: RGB/HSV of the pixel under the mouse
+# Drag:  select a region, its percentile HSV range is shown
+# p: toggle a preview of what the range matches   s: save the range under a name
+# c: clear the region                              q: quit
+
 def mouse_callback(event, x, y, flags, param):
-    global mouse_x, mouse_y
-    if event == cv2.EVENT_MOUSEMOVE:
-        mouse_x, mouse_y = x, y
+    global mouse_x, mouse_y, drag_start, region, dragging
+    mouse_x, mouse_y = x, y
+    if event == cv2.EVENT_LBUTTONDOWN:
+        drag_start = (x, y)
+        dragging = True
+    elif event == cv2.EVENT_LBUTTONUP and dragging:
+        dragging = False
+        x0, x1 = sorted((drag_start[0], x))
+        y0, y1 = sorted((drag_start[1], y))
+        if x1 - x0 >= 2 and y1 - y0 >= 2:
+            region = (x0, y0, x1, y1)
 
-cap = cv2.VideoCapture(0)
+cap = open_camera(0, lock_exposure=LOCK_EXPOSURE, lock_white_balance=LOCK_WHITE_BALANCE)
 cv2.namedWindow("Color Picker")
 cv2.setMouseCallback("Color Picker", mouse_callback)
 
 mouse_x, mouse_y = 0, 0
+drag_start = None
+dragging = False
+region = None
+ranges = None
+preview = False
 
 while True:
     ret, frame = cap.read()
     if not ret:
         break
-    
-    hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    
+
     height, width, _ = frame.shape
-    if 0 <= mouse_x < width and 0 <= mouse_y < height:
+
+    # sample the pixel under the mouse before the preview and overlay change the frame
+    hovering = 0 <= mouse_x < width and 0 <= mouse_y < height and not dragging
+    if hovering:
         b, g, r = frame[mouse_y, mouse_x]
 
-        h, s, v = hsv_frame[mouse_y, mouse_x]
-        
+        # a 1x1 conversion of the pixel under the mouse
+        h, s, v = cv2.cvtColor(frame[mouse_y:mouse_y + 1, mouse_x:mouse_x + 1], cv2.COLOR_BGR2HSV)[0, 0]
+
+    if region is not None:
+        # only the selected pixels are converted, not the whole frame
+        x0, y0, x1, y1 = region
+        x0, x1 = max(x0, 0), min(x1, width)
+        y0, y1 = max(y0, 0), min(y1, height)
+        hsv_region = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+        ranges = hsv_ranges_from_pixels(hsv_region)
+
+        if preview:
+            hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            mask = np.zeros((height, width), dtype=np.uint8)
+            for lower, upper in ranges:
+                mask |= cv2.inRange(hsv_frame, lower, upper)
+            frame[mask == 0] //= 4
+
+        cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 255, 255), 2)
+        for i, (lower, upper) in enumerate(ranges):
+            cv2.putText(frame, f"HSV {lower} - {upper}", (10, 25 + 25 * i),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+    elif dragging:
+        cv2.rectangle(frame, drag_start, (mouse_x, mouse_y), (0, 255, 255), 1)
+
+    if hovering:
         rgb_text = f"RGB: ({r}, {g}, {b})"
         hsv_text = f"HSV: ({h}, {s}, {v})"
-        
+
         cv2.rectangle(frame, (mouse_x + 10, mouse_y - 40), (mouse_x + 250, mouse_y + 10), (0, 0, 0), -1)
         cv2.putText(frame, rgb_text, (mouse_x + 15, mouse_y - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         cv2.putText(frame, hsv_text, (mouse_x + 15, mouse_y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-  
+
         cv2.circle(frame, (mouse_x, mouse_y), 5, (0, 255, 0), 2)
 
     cv2.imshow("Color Picker", frame)
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
+    key = cv2.waitKey(1) & 0xFF
+    if key == ord('q'):
         break
+    elif key == ord('c'):
+        region = None
+        ranges = None
+    elif key == ord('p'):
+        preview = not preview
+    elif key == ord('s') and ranges is not None:
+        name = input("Save range as color name (e.g. green): ").strip().lower()
+        if name:
+            save_color_profile(PROFILE_PATH, name, ranges)
+            print(f"Saved {name}: {ranges} to {os.path.abspath(PROFILE_PATH)}")
 
 cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
@@ -1,7 +1,12 @@
+import os
+import sys
 import cv2
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from camera import open_camera
+
 if __name__ == "__main__":
-    cap = cv2.VideoCapture(0)
+    cap = open_camera(0)
     while True:
         ret, frame = cap.read()
         cv2.imshow("Robot Vision", frame)
@@ -1,3 +1,5 @@
+import os
+import sys
 import cv2
 import serial
 import time
@@ -5,10 +7,16 @@ import math
 import serial.tools.list_ports
 from simple_pid import PID 
 
+# the shared driver code lives next to demo.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from camera import open_camera
+from uart_link import UartChannel
+
 # =========================================
 # Global Variables & Constants
 # =========================================
 uart = None
+link = None
 
 # [Tip] HSV Color Ranges
 COLOR_RANGE = {
@@ -34,56 +42,17 @@ def send_command(cmd_type, arg1, arg2, timeout=15.0):
     - cmd_type: 'A' (Arcade), 'S' (Straight), 'T' (Turn), 'E' (Exit)
     - arg1: throttle (A), distance (S), degrees (T)
     - arg2: turn (A), speed (S), speed (T)
-    """
-    command_str = ""
-    if cmd_type == 'A':
-        command_str = f"A,{arg1:.2f},{arg2:.2f}\n"
-    elif cmd_type == 'S':
-        command_str = f"S,{arg1:.2f},{arg2:.2f}\n"
-    elif cmd_type == 'T':
-        command_str = f"T,{arg1:.2f},{arg2:.2f}\n"
-    elif cmd_type == 'E':
-        command_str = "E\n"
-    else:
-        print(f"Error: Unknown command type {cmd_type}")
-        return
 
-    try:
-        if uart and uart.is_open:
-            if cmd_type in ['S', 'T']:
-                uart.reset_input_buffer()
-
-            uart.write(command_str.encode('utf-8'))
-            
-            # Non-blocking read for Arcade to clear buffer
-            if cmd_type == 'A':
-                while uart.in_waiting > 0:
-                    raw_data = uart.read(uart.in_waiting)
-                    try:
-                        msg = raw_data.decode('utf-8').strip()
-                        if msg:
-                            pass
-                            # print(f"[Pico Feedback]: {msg}")
-                    except:
-                        pass
-
-            # Blocking wait for Straight/Turn
-            if cmd_type in ['S', 'T']:
-                start_time = time.time()
-                while (time.time() - start_time) < timeout:
-                    if uart.in_waiting:
-                        line = uart.readline().decode('utf-8', errors='ignore').strip()
-                        if "DONE" in line.upper(): 
-                            # print(f"Command {cmd_type} Completed.") # Debug
-                            return
-                        if "ERR" in line.upper(): 
-                            print(f"Warning: Robot returned error for {cmd_type}")
-                            return
-                    time.sleep(0.01)
-                print(f"Timeout: Did not receive DONE for command {cmd_type}")
-
-    except Exception as e:
-        print(f"UART Error: {e}")
+    Never blocks: the UART channel writes in the background. 'S' and 'T' return a
+    Future, call .result() on it if you need to wait for the robot to finish.
+    """
+    global link
+    if link is None:
+        if uart is None:
+            return None
+        # uncommenting `uart = find_uart()` below is all it takes, the channel starts on first use
+        link = UartChannel(uart, max_rate_hz=30).start()
+    return link.send(cmd_type, arg1, arg2, timeout)
 
 def find_uart(baudrate=115200, timeout=1, write_timeout=100):
     """
@@ -195,6 +164,8 @@ if __name__ == "__main__":
     # 1. Setup Connection
     try:
         # uart = find_uart()
+        # or, to reconnect by itself when the cable drops (works even if the robot isn't plugged in yet):
+        # link = UartChannel(find_uart(), max_rate_hz=30, reconnect=find_uart).start()
         pass
     except Exception as e:
         print(f"Connection Error: {e}")
@@ -206,10 +177,8 @@ if __name__ == "__main__":
     distance_pid = PID(Kp=0.002, Ki=0.001, Kd=0.0001, setpoint=0, output_limits=(-MAX_EFFORT, MAX_EFFORT))
 
     # 3. Setup Camera
-    cap = cv2.VideoCapture(0)
-    # Lower resolution for better performance
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+    # Lower resolution for better performance, MJPG and a 1-frame buffer for low latency
+    cap = open_camera(0, FRAME_WIDTH, FRAME_HEIGHT)
 
     print("Starting Robot Vision... Press 'q' to exit.")
     
@@ -407,4 +376,4 @@ if __name__ == "__main__":
     send_command('E', 0, 0)
     cap.release()
     cv2.destroyAllWindows()
-    if uart: uart.close()
\ No newline at end of file
+    if link: link.close()
\ No newline at end of file
@@ -1,5 +1,9 @@
 import cv2
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from camera import open_camera
 
 def save_frame_safely(frame, folder_path='./img'):
 
@@ -19,7 +23,7 @@ def save_frame_safely(frame, folder_path='./img'):
     print(f"Image saved: {filename}")
 
 def main():
-    cap = cv2.VideoCapture(0)
+    cap = open_camera(0)
 
     if not cap.isOpened():
         print("Cannot open camera")
@@ -0,0 +1,168 @@
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# CPU-optimized formats, in order of preference when nothing has been measured yet
+EXPORT_FORMATS = ("openvino", "onnx")
+# runtime module each backend needs, "pytorch" is ultralytics itself
+BACKEND_MODULES = {"pytorch": "torch", "onnx": "onnxruntime", "openvino": "openvino"}
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def weights_hash(path):
+    """Short sha256 of the weights file, exports are cached under it."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def available_backends():
+    return [name for name, module in BACKEND_MODULES.items() if importlib.util.find_spec(module) is not None]
+
+
+def export_model(weights, fmt, imgsz=320, int8=False, data=None, cache_dir=EXPORT_DIR, batch=1):
+    """
+    Exports weights to fmt ("onnx" or "openvino") at a fixed input size and batch size and
+    returns the path to load with YOLO(path, task="detect").
+
+    Exports are kept in cache_dir/<name>-<weights hash>-<fmt>-<imgsz>[-int8][-b<batch>] and reused
+    as long as the weights file hashes the same, so retraining invalidates them.
+    INT8 is OpenVINO's post-training quantization (calibrated on data, a dataset yaml,
+    ultralytics' default set if None); ONNX exports are always FP32.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}, use one of {EXPORT_FORMATS}")
+    if int8 and fmt != "openvino":
+        print(f"[Export] INT8 is only supported for openvino, exporting {fmt} as FP32")
+        int8 = False
+
+    name = os.path.splitext(os.path.basename(weights))[0]
+    entry = os.path.join(cache_dir, f"{name}-{weights_hash(weights)}-{fmt}-{imgsz}{'-int8' if int8 else ''}"
+                                    f"{f'-b{batch}' if batch > 1 else ''}")
+    meta_path = os.path.join(entry, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        artifact = os.path.join(entry, meta["artifact"])
+        if os.path.exists(artifact):
+            print(f"[Export] using cached {artifact}")
+            return artifact
+
+    print(f"[Export] exporting {weights} to {fmt} at imgsz {imgsz}{' INT8' if int8 else ''}...")
+    start = time.time()
+    kwargs = {"format": fmt, "imgsz": imgsz}
+    if batch > 1:
+        kwargs["batch"] = batch
+    if int8:
+        kwargs["int8"] = True
+        if data:
+            kwargs["data"] = data
+    exported = YOLO(weights).export(**kwargs)
+
+    # ultralytics writes next to the weights, keep it under the hash instead
+    if os.path.exists(entry):
+        shutil.rmtree(entry)
+    os.makedirs(entry)
+    artifact = os.path.join(entry, os.path.basename(os.path.normpath(exported)))
+    shutil.move(exported, artifact)
+    with open(meta_path, "w") as f:
+        json.dump({"weights": os.path.abspath(weights), "hash": weights_hash(weights), "format": fmt,
+                   "imgsz": imgsz, "int8": int8, "batch": batch, "artifact": os.path.basename(artifact),
+                   "export_seconds": round(time.time() - start, 1)}, f, indent=2)
+    print(f"[Export] {artifact} ({time.time() - start:.0f} s)")
+    return artifact
+
+
+def load_backend(weights, backend, imgsz=320, int8=False, data=None, cache_dir=EXPORT_DIR, batch=1):
+    """
+    Returns a YOLO model for backend: the .pt itself for "pytorch", else its cached
+    export. Exports take exactly batch images per predict call.
+    """
+    if backend == "pytorch":
+        return YOLO(weights)
+    return YOLO(export_model(weights, backend, imgsz, int8, data, cache_dir, batch), task="detect")
+
+
+def load_images(folder, limit=None):
+    names = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    images = [cv2.imread(os.path.join(folder, name)) for name in names[:limit]]
+    return [image for image in images if image is not None]
+
+
+def time_model(model, images, imgsz, conf=0.5, warmup=3):
+    """Per-image predict times (s) and detection counts over images, after warmup runs."""
+    for image in images[:warmup]:
+        model.predict(source=image, imgsz=imgsz, conf=conf, verbose=False)
+    times = []
+    detections = []
+    for image in images:
+        start = time.perf_counter()
+        results = model.predict(source=image, imgsz=imgsz, conf=conf, verbose=False)
+        times.append(time.perf_counter() - start)
+        detections.append(len(results[0].boxes))
+    return np.array(times), np.array(detections)
+
+
+def benchmark_backends(weights, images, imgsz=320, int8=False, backends=None, data=None, conf=0.5,
+                       cache_dir=EXPORT_DIR):
+    """
+    Times every backend on the same images and prints a table. Detections per image are
+    shown next to PyTorch's to catch an export (e.g. INT8) that loses accuracy.
+    Returns {backend: mean seconds per image}.
+    """
+    backends = backends or available_backends()
+    results = {}
+    print(f"{'backend':10s} {'p50 ms':>8s} {'p95 ms':>8s} {'img/s':>7s} {'det/img':>8s}")
+    for backend in backends:
+        try:
+            model = load_backend(weights, backend, imgsz, int8, data, cache_dir)
+        except Exception as e:
+            print(f"{backend:10s} unavailable: {e}")
+            continue
+        times, detections = time_model(model, images, imgsz, conf)
+        ms = times * 1000
+        results[backend] = float(times.mean())
+        print(f"{backend:10s} {np.percentile(ms, 50):8.1f} {np.percentile(ms, 95):8.1f} "
+              f"{1.0 / times.mean():7.1f} {detections.mean():8.2f}")
+    return results
+
+
+def select_backend(weights, imgsz=320, int8=False, images=None, data=None, cache_dir=EXPORT_DIR):
+    """
+    Picks the fastest backend installed here. The choice is measured once per weights
+    hash / imgsz / int8 on images (a blank frame if None) and remembered in cache_dir,
+    so later starts only load the winner.
+    """
+    key = f"{weights_hash(weights)}-{imgsz}{'-int8' if int8 else ''}"
+    choice_path = os.path.join(cache_dir, "backend.json")
+    choices = {}
+    if os.path.exists(choice_path):
+        with open(choice_path) as f:
+            choices = json.load(f)
+    backends = available_backends()
+    if choices.get(key) in backends:
+        print(f"[Export] backend {choices[key]} (measured before for these weights)")
+        return choices[key]
+
+    if not images:
+        images = [np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * 10
+    timings = benchmark_backends(weights, images, imgsz, int8, backends, data, cache_dir=cache_dir)
+    if not timings:
+        return "pytorch"
+    best = min(timings, key=timings.get)
+    choices[key] = best
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(choice_path, "w") as f:
+        json.dump(choices, f, indent=2)
+    print(f"[Export] fastest backend: {best} ({1.0 / timings[best]:.1f} img/s)")
+    return best
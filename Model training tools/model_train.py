@@ -1,8 +1,20 @@
 from ultralytics import YOLO 
 
+from model_export import EXPORT_FORMATS, export_model
+
+EXPORT_IMGSZ = 320  # run.py's default inference size
+
 model = YOLO('yolov8n.pt')
 results = model.train(
     data='/content/my_yolo_dataset/data.yaml',
     epochs=20,
     imgsz=640
-)
\ No newline at end of file
+)
+
+# CPU-optimized copies of best.pt next to it for run.py, cached by the weights' hash
+best = f"{model.trainer.save_dir}/weights/best.pt"
+for fmt in EXPORT_FORMATS:
+    try:
+        export_model(best, fmt, imgsz=EXPORT_IMGSZ)
+    except Exception as e:
+        print(f"[Export] {fmt} export failed: {e}")
\ No newline at end of file
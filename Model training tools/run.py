@@ -1,23 +1,406 @@
+import argparse
+import collections
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
 import cv2
-from ultralytics import YOLO
- 
-model = YOLO("best.pt")
-cap = cv2.VideoCapture(0)
- 
-cv2.namedWindow("My AI Camera", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("My AI Camera", 800, 600)
-while True:
-    ret, frame = cap.read()
- 
-    if not ret:
-        break
- 
-    results = model.predict(source=frame, conf=0.5)
-    annotated_frame = results[0].plot()
-    
-    cv2.imshow("My AI Camera", annotated_frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
- 
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from camera import LatestFrameReader, open_camera
+from model_export import (BACKEND_MODULES, IMAGE_EXTENSIONS, available_backends, benchmark_backends, load_backend,
+                          load_images, select_backend)
+
+MODEL_PATH = "best.pt"
+CONFIDENCE = 0.5
+IMGSZ = 320                   # inference size, exports are built for exactly this size
+BACKEND = "auto"              # "pytorch", "onnx", "openvino" or "auto" (fastest installed, measured once)
+INT8 = False                  # INT8-quantized OpenVINO export (check det/img with --benchmark)
+WINDOW_NAME = "My AI Camera"
+REPORT_INTERVAL = 5.0         # seconds between inference rate / latency reports
+BATCH_SIZE = 16               # frames per predict call in batch mode (--source)
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+DETECTION_COLUMNS = ["source", "frame", "class", "name", "conf", "x1", "y1", "x2", "y2"]
+# .npz arrays written per detection: name -> (dtype, shape of one row)
+NPZ_COLUMNS = {"source": (np.int32, ()), "frame": (np.int32, ()), "cls": (np.int16, ()),
+               "conf": (np.float32, ()), "xyxy": (np.float32, (4,))}
+
+
+class AsyncPredictor:
+    """
+    Runs model.predict on its own thread, always on the newest camera frame.
+
+    Frames that arrive while a prediction runs are dropped by the LatestFrameReader,
+    so a result is never more than one inference behind the camera. The newest result
+    is kept together with its frame's capture timestamp for the display loop. If
+    predict raises, the thread stops and read_result raises the same exception.
+
+    Args:
+    - model: a loaded YOLO model
+    - reader: a started LatestFrameReader
+    - conf: confidence threshold
+    - imgsz: inference size
+    """
+
+    def __init__(self, model, reader, conf=0.5, imgsz=IMGSZ):
+        self.model = model
+        self.reader = reader
+        self.conf = conf
+        self.imgsz = imgsz
+
+        self._cond = threading.Condition()
+        self._result = None   # (result, frame capture timestamp)
+        self._result_id = 0
+        self._running = False
+        self._thread = None
+        self._error = None
+
+        self.inferences = 0
+        self.inference_times = collections.deque(maxlen=300)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="AsyncPredictor", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            frame, _, timestamp = self.reader.read_latest(timeout=0.5)
+            if frame is None:
+                continue
+            start = time.perf_counter()
+            try:
+                results = self.model.predict(source=frame, imgsz=self.imgsz, conf=self.conf, verbose=False)
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._running = False
+                    self._cond.notify_all()
+                return
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._result = (results[0], timestamp)
+                self._result_id += 1
+                self.inferences += 1
+                self.inference_times.append(elapsed)
+                self._cond.notify_all()
+
+    def read_result(self, last_id, timeout=0.03):
+        """
+        Waits up to timeout for a result newer than last_id.
+
+        Returns (result, result_id, capture timestamp), or (None, last_id, 0.0).
+        Raises the exception that stopped the prediction thread.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._result_id > last_id or not self._running, timeout)
+            if self._error is not None:
+                raise self._error
+            if self._result_id <= last_id:
+                return None, last_id, 0.0
+            result, timestamp = self._result
+            return result, self._result_id, timestamp
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+
+def print_report(elapsed, inferences, inference_times, latencies, camera_stats=None):
+    latencies_ms = np.array(latencies) * 1000
+    inference_ms = np.array(inference_times) * 1000
+    message = f"[Inference] {inferences / elapsed:.1f} fps"
+    if len(inference_ms):
+        message += f" (predict p50 {np.percentile(inference_ms, 50):.0f} ms)"
+    if len(latencies_ms):
+        message += (f", end-to-end latency p50 {np.percentile(latencies_ms, 50):.0f} ms, "
+                    f"p95 {np.percentile(latencies_ms, 95):.0f} ms")
+    if camera_stats is not None:
+        message += f", camera {camera_stats['captured'] / elapsed:.1f} fps, dropped {camera_stats['dropped']}"
+    print(message)
+
+
+def run_async(model, cap, conf, imgsz=IMGSZ):
+    # capture, inference and display each run at their own pace
+    reader = LatestFrameReader(cap).start()
+    predictor = AsyncPredictor(model, reader, conf, imgsz).start()
+    latencies = collections.deque(maxlen=300)
+    result_id = 0
+    start = last_report = time.time()
+    last_inferences = 0
+    last_camera = reader.stats()
+    try:
+        while True:
+            result, result_id, timestamp = predictor.read_result(result_id)
+            if result is not None:
+                cv2.imshow(WINDOW_NAME, result.plot())
+                # capture of the frame until its annotated result is on screen
+                latencies.append(time.time() - timestamp)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+            now = time.time()
+            if now - last_report >= REPORT_INTERVAL:
+                camera = reader.stats()
+                camera_delta = {key: camera[key] - last_camera[key] for key in camera}
+                print_report(now - last_report, predictor.inferences - last_inferences,
+                             predictor.inference_times, latencies, camera_delta)
+                last_report, last_inferences, last_camera = now, predictor.inferences, camera
+    finally:
+        predictor.stop()
+        reader.release()
+        print_report(time.time() - start, predictor.inferences, predictor.inference_times, latencies,
+                     reader.stats())
+
+
+def run_sync(model, cap, conf, imgsz=IMGSZ):
+    # the original loop: capture, predict and display one after the other
+    inference_times = collections.deque(maxlen=300)
+    latencies = collections.deque(maxlen=300)
+    inferences = 0
+    start = last_report = time.time()
+    last_inferences = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = time.time()
+
+            predict_start = time.perf_counter()
+            results = model.predict(source=frame, imgsz=imgsz, conf=conf, verbose=False)
+            inference_times.append(time.perf_counter() - predict_start)
+            inferences += 1
+            annotated_frame = results[0].plot()
+
+            cv2.imshow(WINDOW_NAME, annotated_frame)
+            latencies.append(time.time() - timestamp)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+            now = time.time()
+            if now - last_report >= REPORT_INTERVAL:
+                print_report(now - last_report, inferences - last_inferences, inference_times, latencies)
+                last_report, last_inferences = now, inferences
+    finally:
+        cap.release()
+        print_report(time.time() - start, inferences, inference_times, latencies)
+
+
+def iter_source_frames(paths, stride=1):
+    """
+    Yields (source, frame_index, frame) from video files, image files and folders of
+    both (folders in name order, not recursive), one frame at a time so memory doesn't
+    depend on the length of a video. stride keeps every Nth video frame.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS))
+            for name in names:
+                yield from iter_source_frames([os.path.join(path, name)], stride)
+        elif path.lower().endswith(IMAGE_EXTENSIONS):
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Cannot read image {path}, skipped")
+                continue
+            yield path, 0, frame
+        else:
+            cap = cv2.VideoCapture(path)
+            if not cap.isOpened():
+                print(f"Cannot open video {path}, skipped")
+                continue
+            try:
+                index = 0
+                while True:
+                    # grab() skips the decode of frames the stride drops
+                    if not cap.grab():
+                        break
+                    if index % stride == 0:
+                        ret, frame = cap.retrieve()
+                        if ret:
+                            yield path, index, frame
+                    index += 1
+            finally:
+                cap.release()
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DetectionWriter:
+    """
+    Writes detections to .csv (one row per box) or .npz (one array per column, float32
+    boxes, sources stored once and referenced by index). Both are streamed to disk, the
+    .npz columns go to raw files in a temporary folder and are copied into the archive
+    on close, so memory doesn't grow with the number of detections.
+
+    Args:
+    - path: output file, the extension picks the format
+    - names: class id -> class name, from model.names
+    """
+
+    def __init__(self, path, names):
+        self.path = path
+        self.names = names
+        self.count = 0
+        self._sources = {}
+        self._csv_file = None
+        self._parts = None
+        if path.lower().endswith(".npz"):
+            self._part_dir = tempfile.mkdtemp(prefix="detections-", dir=os.path.dirname(os.path.abspath(path)))
+            self._parts = {name: open(os.path.join(self._part_dir, name), "wb") for name in NPZ_COLUMNS}
+            return
+        if not path.lower().endswith(".csv"):
+            raise ValueError(f"Unknown output format {path}, use .csv or .npz")
+        self._csv_file = open(path, "w", newline="")
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(DETECTION_COLUMNS)
+
+    def write(self, source, frame_index, boxes):
+        """boxes: ultralytics Boxes of one frame."""
+        if len(boxes) == 0:
+            return
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+        conf = boxes.conf.cpu().numpy().astype(np.float32)
+        cls = boxes.cls.cpu().numpy().astype(np.int16)
+        self.count += len(cls)
+        if self._csv_file is not None:
+            for (x1, y1, x2, y2), c, k in zip(xyxy, conf, cls):
+                self._csv.writerow([source, frame_index, int(k), self.names.get(int(k), k), f"{c:.3f}",
+                                    f"{x1:.1f}", f"{y1:.1f}", f"{x2:.1f}", f"{y2:.1f}"])
+            return
+        source_id = self._sources.setdefault(source, len(self._sources))
+        columns = {"source": np.full(len(cls), source_id), "frame": np.full(len(cls), frame_index),
+                   "cls": cls, "conf": conf, "xyxy": xyxy}
+        for name, (dtype, _) in NPZ_COLUMNS.items():
+            columns[name].astype(dtype).tofile(self._parts[name])
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            return
+        try:
+            # same layout as np.savez_compressed, each column copied in pieces from its part file
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name, (dtype, row_shape) in NPZ_COLUMNS.items():
+                    self._parts[name].close()
+                    header = {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False,
+                              "shape": (self.count,) + row_shape}
+                    with archive.open(f"{name}.npy", "w", force_zip64=True) as member, \
+                            open(self._parts[name].name, "rb") as part:
+                        np.lib.format.write_array_header_1_0(member, header)
+                        shutil.copyfileobj(part, member, 1 << 20)
+                for name, array in (("sources", np.array(list(self._sources))),
+                                    ("names", np.array([self.names[k] for k in sorted(self.names)]))):
+                    with archive.open(f"{name}.npy", "w") as member:
+                        np.lib.format.write_array(member, array)
+        finally:
+            for part in self._parts.values():
+                part.close()
+            shutil.rmtree(self._part_dir, ignore_errors=True)
+
+
+def run_batch(model, paths, output, batch_size=BATCH_SIZE, conf=CONFIDENCE, imgsz=IMGSZ, stride=1,
+              fixed_batch=False):
+    """
+    Runs the model over videos / image folders in batches of batch_size frames and
+    writes the detections to output (.csv or .npz) instead of drawing them. Prints the
+    throughput every REPORT_INTERVAL seconds and at the end. fixed_batch pads the last
+    batch for exports built for exactly batch_size images.
+    """
+    writer = DetectionWriter(output, model.names)
+    frames = 0
+    start = last_report = time.time()
+    last_frames = 0
+    try:
+        for batch in iter_batches(iter_source_frames(paths, stride), batch_size):
+            images = [frame for _, _, frame in batch]
+            if fixed_batch:
+                images += [images[-1]] * (batch_size - len(images))
+            results = model.predict(source=images, imgsz=imgsz, conf=conf, verbose=False)
+            for (source, frame_index, _), result in zip(batch, results):
+                writer.write(source, frame_index, result.boxes)
+            frames += len(batch)
+
+            now = time.time()
+            if now - last_report >= REPORT_INTERVAL:
+                print(f"[Batch] {frames} frames, {(frames - last_frames) / (now - last_report):.1f} img/s, "
+                      f"{writer.count} detections, at {batch[-1][0]} frame {batch[-1][1]}")
+                last_report, last_frames = now, frames
+    finally:
+        writer.close()
+    elapsed = time.time() - start
+    print(f"[Batch] {frames} frames in {elapsed:.1f} s ({frames / elapsed if elapsed else 0:.1f} img/s), "
+          f"{writer.count} detections written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the trained YOLO model on the camera")
+    parser.add_argument("--model", default=MODEL_PATH, help="weights to load")
+    parser.add_argument("--conf", type=float, default=CONFIDENCE, help="confidence threshold")
+    parser.add_argument("--camera", type=int, default=0, help="camera index")
+    parser.add_argument("--sync", action="store_true",
+                        help="capture, predict and display in one thread (every frame, growing lag)")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ, help="inference / export input size")
+    parser.add_argument("--backend", default=BACKEND, choices=["auto"] + list(BACKEND_MODULES),
+                        help="inference runtime, exports are cached by weights hash")
+    parser.add_argument("--int8", action="store_true", default=INT8, help="INT8-quantized OpenVINO export")
+    parser.add_argument("--data", help="dataset yaml to calibrate the INT8 export on")
+    parser.add_argument("--images", help="folder of test images for --benchmark and the auto backend choice")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="compare the installed backends on --images and exit")
+    parser.add_argument("--source", nargs="+",
+                        help="batch mode: videos, images or folders of them, instead of the camera")
+    parser.add_argument("--output", default="detections.csv", help="batch mode results, .csv or .npz")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="batch mode frames per predict call")
+    parser.add_argument("--stride", type=int, default=1, help="batch mode: keep every Nth video frame")
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else None
+    if args.benchmark:
+        if not images:
+            parser.error("--benchmark needs --images with at least one image")
+        print(f"Benchmarking {', '.join(available_backends())} on {len(images)} images at imgsz {args.imgsz}")
+        benchmark_backends(args.model, images, args.imgsz, args.int8, data=args.data, conf=args.conf)
+        sys.exit(0)
+
+    backend = args.backend
+    if backend == "auto":
+        backend = select_backend(args.model, args.imgsz, args.int8, images, args.data)
+    if args.source:
+        # exports have a fixed batch size, they get one built for --batch
+        model = load_backend(args.model, backend, args.imgsz, args.int8, args.data, batch=args.batch)
+        print(f"Running {args.model} on {backend} at imgsz {args.imgsz}, batches of {args.batch}")
+        run_batch(model, args.source, args.output, args.batch, args.conf, args.imgsz, args.stride,
+                  fixed_batch=backend != "pytorch")
+        sys.exit(0)
+
+    model = load_backend(args.model, backend, args.imgsz, args.int8, args.data)
+    print(f"Running {args.model} on {backend} at imgsz {args.imgsz}")
+    cap = open_camera(args.camera)
+
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(WINDOW_NAME, 800, 600)
+    if args.sync:
+        run_sync(model, cap, args.conf, args.imgsz)
+    else:
+        run_async(model, cap, args.conf, args.imgsz)
+    cv2.destroyAllWindows()
@@ -1,5 +1,6 @@
 import sys
 import select
+import struct
 import bluetooth
 import time
 import math
@@ -26,14 +27,103 @@ MODE_MANUAL = 0
 MODE_AUTO = 1
 current_mode = MODE_MANUAL
 
+# Binary protocol (same layout as uart_link.py on the host), enabled when the host sends "B"
+# command frame: sync, command id, seq, int16 arg1, int16 arg2, crc8
+# reply frame:   sync, status, seq, crc8
+# 0x03 (Ctrl-C) and ESCAPE after the sync byte arrive as ESCAPE, byte ^ 0x20, so Ctrl-C stays on
+CMD_SYNC = 0xA5
+REPLY_SYNC = 0xA6
+FRAME_FORMAT = "<BBBhhB"
+FRAME_SIZE = 8
+REPLY_ACK = ord('K')
+REPLY_DONE = ord('D')
+REPLY_ERR = ord('R')
+REPLY_NAK = ord('N')
+ESCAPE = 0x7D
+binary_mode = False
+
+def make_crc8_table():
+    table = bytearray(256)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[byte] = crc
+    return table
+
+CRC8_TABLE = make_crc8_table()
+
+def crc8(data, length):
+    crc = 0
+    for i in range(length):
+        crc = CRC8_TABLE[crc ^ data[i]]
+    return crc
+
 print(f"System Started. Mode: MANUAL. Waiting for PestoLink...")
 
 def clear_input_buffer():
+    # byte by byte: a binary frame has no newline for readline() to stop at
+    while sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
+        sys.stdin.buffer.read(1)
+
+def answer_probe():
+    # MANUAL mode only listens for the host's port probe ("I"), everything else is dropped
+    probed = False
     while sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
-        sys.stdin.readline()
+        if sys.stdin.buffer.read(1) == b'I':
+            probed = True
+    if probed:
+        print(f"XRP {ROBOT_NAME} MANUAL")
+
+def read_frame(first):
+    # the rest of the frame arrives right behind the sync byte, undo the host's escaping
+    frame = bytearray(first)
+    while len(frame) < FRAME_SIZE:
+        byte = sys.stdin.buffer.read(1)
+        if not byte:
+            break
+        if byte[0] == ESCAPE:
+            byte = bytes((sys.stdin.buffer.read(1)[0] ^ 0x20,))
+        frame += byte
+    return frame
+
+def send_reply(status, seq):
+    reply = bytearray((REPLY_SYNC, status, seq, 0))
+    reply[3] = crc8(reply, 3)
+    sys.stdout.buffer.write(reply)
+
+def handle_binary_frame(frame):
+    global binary_mode
+    board.led_on()
+    if len(frame) != FRAME_SIZE or crc8(frame, FRAME_SIZE - 1) != frame[FRAME_SIZE - 1]:
+        send_reply(REPLY_NAK, frame[2] if len(frame) > 2 else 0)
+        return True
+    # host may already be talking binary (e.g. we rebooted)
+    binary_mode = True
+
+    _, cmd, seq, arg1, arg2, _ = struct.unpack(FRAME_FORMAT, frame)
+    try:
+        if cmd == ord('E'):
+            send_reply(REPLY_ACK, seq)
+            return False
+        elif cmd == ord('A'):
+            drivetrain.arcade(arg1 / 1000, arg2 / 1000)
+            send_reply(REPLY_ACK, seq)
+        elif cmd == ord('S'):
+            drivetrain.straight(arg1 / 10, arg2 / 1000)
+            send_reply(REPLY_DONE, seq)
+        elif cmd == ord('T'):
+            drivetrain.turn(arg1 / 10, arg2 / 1000)
+            send_reply(REPLY_DONE, seq)
+        else:
+            send_reply(REPLY_ERR, seq)
+    except Exception:
+        send_reply(REPLY_ERR, seq)
+
+    return True
 
 def handle_auto_command(line):
-    global current_mode
+    global current_mode, binary_mode
     board.led_on()
     try:
         parts = line.split(',')
@@ -74,6 +164,15 @@ def handle_auto_command(line):
                 print("Done")
             else:
                 print("Err")
+
+        elif cmd == 'I':
+            # Identify: lets the host confirm it found the robot's serial port
+            print(f"XRP {ROBOT_NAME} AUTO")
+
+        elif cmd == 'B':
+            # Binary: host switches to struct frames, see handle_binary_frame
+            binary_mode = True
+            print("Binary OK")
         
         else:
             print(f"Unknown command: {cmd}")
@@ -117,6 +216,9 @@ while True:
         else:
             drivetrain.stop()
 
+        if current_mode == MODE_MANUAL:
+            answer_probe()
+
     # ------------------------------------------------
     # 2. AUTO MODE
     # ------------------------------------------------
@@ -133,15 +235,21 @@ while True:
 
 
         if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
-            line = sys.stdin.readline().strip()
-            if line:
-                # Handle command
-                keep_auto = handle_auto_command(line)
-                if not keep_auto:
-                    # Received 'E' command, switch back to manual
-                    drivetrain.stop()
-                    current_mode = MODE_MANUAL
-                    board.led_off()
+            first = sys.stdin.buffer.read(1)
+            keep_auto = True
+            if first and first[0] == CMD_SYNC:
+                keep_auto = handle_binary_frame(read_frame(first))
+            elif first:
+                line = (chr(first[0]) + sys.stdin.readline()).strip()
+                if line:
+                    # Handle command
+                    keep_auto = handle_auto_command(line)
+            if not keep_auto:
+                # Received 'E' command, switch back to manual; the host's session is over
+                drivetrain.stop()
+                current_mode = MODE_MANUAL
+                binary_mode = False
+                board.led_off()
 
     # Sleep a bit to free CPU resources, avoid overheating or high usage
     time.sleep(0.01)
\ No newline at end of file
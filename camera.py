@@ -0,0 +1,221 @@
+import threading
+import time
+
+import cv2
+
+
+class LatestFrameReader:
+    """
+    Reads frames from a cv2.VideoCapture on its own thread and keeps only the newest one.
+
+    The capture thread drains the driver as fast as the camera delivers, so the vision
+    loop always gets the freshest frame instead of one that sat in the driver buffer.
+    Every frame gets a counter and a capture timestamp (time.time()).
+
+    Args:
+    - cap: an opened cv2.VideoCapture (or anything with read()/isOpened()/release())
+    - report_drops: print how many frames were dropped every report_interval seconds
+    - report_interval: seconds between drop reports
+    """
+
+    def __init__(self, cap, report_drops=False, report_interval=5.0):
+        self._cap = cap
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_id = 0
+        self._timestamp = 0.0
+        self._last_returned_id = 0
+        self._running = False
+        self._thread = None
+
+        self.report_drops = report_drops
+        self.report_interval = report_interval
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self._last_report_time = time.time()
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="LatestFrameReader", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self._cap.read()
+            timestamp = time.time()
+            if not ret:
+                time.sleep(0.005)
+                continue
+
+            with self._cond:
+                # the previous frame was never handed to the vision loop
+                if self._frame_id > self._last_returned_id:
+                    self.dropped_frames += 1
+                self._frame = frame
+                self._frame_id += 1
+                self._timestamp = timestamp
+                self.captured_frames += 1
+                self._cond.notify_all()
+
+            if self.report_drops and timestamp - self._last_report_time >= self.report_interval:
+                self._last_report_time = timestamp
+                print(f"[Camera] captured {self.captured_frames} frames, dropped {self.dropped_frames}")
+
+    def read_latest(self, timeout=1.0):
+        """
+        Waits for a frame newer than the last one returned.
+
+        Returns (frame, frame_id, timestamp), or (None, last_frame_id, 0.0) on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame_id > self._last_returned_id or not self._running, timeout):
+                return None, self._last_returned_id, 0.0
+            if self._frame_id <= self._last_returned_id:
+                return None, self._last_returned_id, 0.0
+            self._last_returned_id = self._frame_id
+            return self._frame, self._frame_id, self._timestamp
+
+    def read(self):
+        # Same shape as cv2.VideoCapture.read() so existing loops can switch over directly
+        frame, _, _ = self.read_latest()
+        return frame is not None, frame
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def stats(self):
+        return {"captured": self.captured_frames, "dropped": self.dropped_frames}
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self.report_drops:
+            print(f"[Camera] total captured {self.captured_frames} frames, dropped {self.dropped_frames}")
+
+    def release(self):
+        self.stop()
+        self._cap.release()
+
+
+def _fourcc_name(value):
+    # None when the backend doesn't report the format (0 or garbage)
+    code = int(value)
+    name = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+    return name if code and name.isprintable() and name.strip() else None
+
+
+def camera_settings(cap):
+    """
+    What the driver actually accepted, read back from the capture.
+    """
+    return {
+        "backend": cap.getBackendName() if cap.isOpened() else None,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "fourcc": _fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+        "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        "auto_exposure": cap.get(cv2.CAP_PROP_AUTO_EXPOSURE),
+        "exposure": cap.get(cv2.CAP_PROP_EXPOSURE),
+        "auto_wb": cap.get(cv2.CAP_PROP_AUTO_WB),
+        "wb_temperature": cap.get(cv2.CAP_PROP_WB_TEMPERATURE),
+    }
+
+
+def open_camera(index=0, width=None, height=None, fps=30, fourccs=("MJPG", "YUYV"), buffer_size=1,
+                lock_exposure=False, lock_white_balance=False, settle_frames=30):
+    """
+    Opens a camera tuned for low latency and prints the settings the driver accepted.
+
+    Tries each pixel format in fourccs with the requested size and rate and keeps the
+    one the driver delivers fastest (MJPG usually reaches 30 fps at sizes where raw YUYV
+    is stuck at 5-15). CAP_PROP_BUFFERSIZE keeps the driver from queueing stale frames.
+    The locks let auto exposure / white balance settle for settle_frames frames, then
+    freeze them at their current values so HSV thresholds don't drift with the scene.
+    Drivers ignore what they don't support; the report shows what really applied.
+
+    Args:
+    - index: camera index for cv2.VideoCapture
+    - width, height: requested frame size, None = driver default
+    - fps: requested frame rate, None = driver default
+    - fourccs: pixel formats to try, in order of preference ((): leave the default)
+    - buffer_size: driver frame queue length, None = driver default
+    - lock_exposure: switch to manual exposure after settling
+    - lock_white_balance: switch off auto white balance after settling
+    - settle_frames: frames to read before locking
+    """
+    cap = cv2.VideoCapture(index)
+    if not cap.isOpened():
+        print(f"[Camera] cannot open camera {index}")
+        return cap
+
+    def request(fourcc):
+        # format first: many UVC drivers only offer some sizes / rates per format
+        if fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            cap.set(cv2.CAP_PROP_FPS, fps)
+        return camera_settings(cap)
+
+    best = None
+    for fourcc in fourccs:
+        accepted = request(fourcc)
+        if accepted["fourcc"] is None:
+            # the backend can't tell which format is active, trying others proves nothing
+            break
+        if accepted["fourcc"] != fourcc:
+            continue
+        if best is None or accepted["fps"] > best[1]:
+            best = (fourcc, accepted["fps"])
+        if not fps or accepted["fps"] >= fps:
+            break
+    unconfirmed = best is None and bool(fourccs)
+    if best is not None:
+        if accepted["fourcc"] != best[0]:
+            request(best[0])
+    elif fourccs:
+        # unreported or none taken: ask for the preferred format, not the last one tried
+        request(fourccs[0])
+    else:
+        # no format asked for: keep the driver's, still ask for size and rate
+        request(None)
+
+    if buffer_size:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    if lock_exposure or lock_white_balance:
+        for _ in range(settle_frames):
+            cap.read()
+    if lock_exposure:
+        exposure = cap.get(cv2.CAP_PROP_EXPOSURE)
+        # manual mode is 1 on V4L2 and 0.25 on the Windows backends
+        cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1 if cap.getBackendName() == "V4L2" else 0.25)
+        cap.set(cv2.CAP_PROP_EXPOSURE, exposure)
+    if lock_white_balance:
+        temperature = cap.get(cv2.CAP_PROP_WB_TEMPERATURE)
+        cap.set(cv2.CAP_PROP_AUTO_WB, 0)
+        if temperature > 0:
+            cap.set(cv2.CAP_PROP_WB_TEMPERATURE, temperature)
+
+    accepted = camera_settings(cap)
+    if unconfirmed:
+        accepted["fourcc"] = f"{fourccs[0]} (unconfirmed)"
+    requested = f"{width or '-'}x{height or '-'} {'/'.join(fourccs) or '-'} @{fps or '-'}fps, buffer {buffer_size or '-'}"
+    print(f"[Camera] {accepted['backend']} camera {index}: requested {requested}; "
+          f"got {accepted['width']}x{accepted['height']} {accepted['fourcc']} @{accepted['fps']:g}fps, "
+          f"buffer {accepted['buffer_size']}")
+    if lock_exposure or lock_white_balance:
+        print(f"[Camera] auto exposure {accepted['auto_exposure']:g} (exposure {accepted['exposure']:g}), "
+              f"auto white balance {accepted['auto_wb']:g} (temperature {accepted['wb_temperature']:g})")
+    return cap
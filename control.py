@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+class ControlScheduler:
+    """
+    Runs the control half of the loop (PIDs + send_command) on its own thread at a fixed
+    rate, so PID dt and control bandwidth no longer follow the vision frame rate.
+
+    Vision calls publish() with each new measurement and its capture timestamp. Every
+    tick uses the latest one: control_fn(measurement, fresh) computes the command, where
+    fresh is True only the first time a measurement is used. A measurement older than
+    stale_after seconds is flagged: the tick sends a stop (0, 0) instead and counts it.
+
+    Args:
+    - control_fn: (measurement, fresh) -> (throttle, turn)
+    - send_fn: (throttle, turn) -> None, e.g. lambda t, r: send_command('A', t, r)
+    - rate_hz: control ticks per second
+    - stale_after: staleness budget in seconds (capture time to tick)
+    """
+
+    def __init__(self, control_fn, send_fn, rate_hz=30.0, stale_after=0.25):
+        self.control_fn = control_fn
+        self.send_fn = send_fn
+        self.rate_hz = rate_hz
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._measurement = None
+        self._timestamp = 0.0
+        self._fresh = False
+        self._running = False
+        self._thread = None
+
+        self.ticks = 0
+        self.stale_ticks = 0
+        self.overruns = 0
+        self.measurements = 0
+        self._total_age = 0.0
+        self.max_age = 0.0
+        self.stale = False
+        self._had_measurement = False
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ControlScheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def publish(self, measurement, timestamp=None):
+        """
+        Hands a new measurement to the control thread. timestamp is its capture time
+        (time.time(), default now).
+        """
+        with self._lock:
+            self._measurement = measurement
+            self._timestamp = time.time() if timestamp is None else timestamp
+            self._fresh = True
+            self.measurements += 1
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        next_tick = time.perf_counter()
+        while self._running:
+            with self._lock:
+                measurement, timestamp, fresh = self._measurement, self._timestamp, self._fresh
+                self._fresh = False
+
+            age = time.time() - timestamp
+            stale = measurement is None or age > self.stale_after
+            # no message for the wait before vision's first measurement
+            if stale != self.stale and self._had_measurement:
+                print(f"[Control] measurement {'stale' if stale else 'fresh again'} "
+                      f"(age {age * 1000:.0f} ms, budget {self.stale_after * 1000:.0f} ms)")
+            self.stale = stale
+            self._had_measurement = measurement is not None
+
+            if stale:
+                self.stale_ticks += 1
+                throttle, turn = 0.0, 0.0
+            else:
+                self._total_age += age
+                self.max_age = max(self.max_age, age)
+                throttle, turn = self.control_fn(measurement, fresh)
+            self.send_fn(throttle, turn)
+            self.ticks += 1
+
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind: skip the missed ticks rather than bursting to catch up
+                self.overruns += 1
+                next_tick = time.perf_counter()
+
+    def stats(self):
+        used = self.ticks - self.stale_ticks
+        return {
+            "ticks": self.ticks,
+            "stale_ticks": self.stale_ticks,
+            "overruns": self.overruns,
+            "measurements": self.measurements,
+            "mean_age": self._total_age / used if used else 0.0,
+            "max_age": self.max_age,
+        }
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        stats = self.stats()
+        print(f"[Control] {stats['ticks']} ticks at {self.rate_hz} Hz for {stats['measurements']} measurements, "
+              f"stale {stats['stale_ticks']}, overruns {stats['overruns']}, "
+              f"measurement age mean {stats['mean_age'] * 1000:.1f} ms, max {stats['max_age'] * 1000:.1f} ms")
@@ -2,10 +2,22 @@ import cv2
 import serial
 import time
 import math
-import serial.tools.list_ports
+import os
+import signal
+import numpy as np
+from collections import namedtuple
 from simple_pid import PID 
+from camera import LatestFrameReader, open_camera
+from control import ControlScheduler
+from governor import QualityGovernor
+from profiler import StageProfiler
+from recorder import VideoRecorder
+from uart_link import UartChannel, discover_port
+from vision import (BoxTracker, ColorSegmenter, FramePool, RoiTracker, TargetDetector, contour_stats,
+                    load_color_profiles, select_contours, stats_boxes)
 
 uart = None
+link = None
 
 COLOR_RANGE = {
     "red": [((0, 43, 46), (10, 255, 255)), ((156, 43, 46), (180, 255, 255))],
@@ -14,108 +26,106 @@ COLOR_RANGE = {
     "yellow": [((20, 43, 46), (30, 255, 255))],
     "purple": [((140, 43, 46), (160, 255, 255))],
 }
+# ranges tuned with "Computer Vision tools/color_picker.py" replace the defaults above
+COLOR_PROFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "color_profiles.json")
+_profiles = load_color_profiles(COLOR_PROFILES)
+if _profiles:
+    COLOR_RANGE.update(_profiles)
+    print(f"Loaded color profiles {', '.join(_profiles)} from {COLOR_PROFILES}")
+# compiled once from COLOR_RANGE, rebuilt automatically if the ranges are edited
+SEGMENTER = ColorSegmenter(COLOR_RANGE)
 TARGET_COLOR = "green"
 TARGET_SHAPE = "circle"
+# targets to visit in order, e.g. [("green", "circle"), ("red", "square"), ("blue", "triangle")]
+TARGET_SEQUENCE = [(TARGET_COLOR, TARGET_SHAPE)]
+MIN_TARGET_AREA = 3500        # px², smaller contours are ignored
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+CAMERA_FPS = 30               # requested camera frame rate
+CAMERA_FOURCC = ("MJPG", "YUYV") # pixel formats to try in order, MJPG usually reaches CAMERA_FPS at 640x480
+CAMERA_BUFFER_SIZE = 1        # driver frame queue, 1 = no stale frames waiting in the driver
+LOCK_EXPOSURE = False         # freeze auto exposure after startup so HSV ranges don't drift (use the same in color_picker.py)
+LOCK_WHITE_BALANCE = False    # freeze auto white balance after startup
 SEARCH_TURN_EFFORT = 0.66
 MAX_EFFORT = 0.95
+THREADED_CAPTURE = True       # read the camera on its own thread, always process the newest frame
+REPORT_DROPPED_FRAMES = False # print how many camera frames the vision loop skipped
+UART_RATE_HZ = 30             # max arcade commands written per second
+CONTROL_RATE_HZ = 30          # run the PIDs + send_command on their own thread at this rate (0 = once per frame)
+MEASUREMENT_STALE_AFTER = 0.25 # seconds; older vision measurements are flagged and the robot is stopped
+UART_PROTOCOL = "binary"      # ask the pico for binary frames, falls back to ASCII on older controller.py
+UART_PORT = None              # open this port instead of scanning, e.g. the pty printed by pico_emulator.py
+# last port that answered the handshake, tried first on the next start
+UART_PORT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".uart_port")
+UART_SCAN_ALL_PORTS = False   # no XRP-looking USB port found: send the "I" probe to every serial device
+UART_RECONNECT = True         # rediscover the pico in the background when the link drops (or isn't there at start)
+ROI_TRACKING = True           # once locked on, only search a window around the last target
+ROI_FULL_SEARCH_INTERVAL = 30 # still search the full frame every N frames while tracking
+BLUR_KSIZE = 7                # Gaussian blur before segmentation (odd, 1 = none)
+PYRAMID_LEVELS = 0            # find candidates at 1/2**N resolution, refine at full size (0 = off, try replay.py --compare-pyramid)
+DETECT_INTERVAL = 1           # run detection every N frames, steer on the tracker's prediction in between
+PREDICT_MISSES = True         # keep steering on the predicted target when a detection fails
+MAX_COAST_TIME = 0.5          # seconds the target is predicted without a detection before searching
+DETECT_ALL_TARGETS = False    # detect every color/shape in one pass (TargetDetector) instead of one pair
+HEADLESS = False              # no window, no recording, no overlay drawing (robots on autostart); stop with Ctrl+C
+SHOW_WINDOW = True            # debug consumer: cv2.imshow window
+RECORD_VIDEO = True           # debug consumer: annotated output.avi, encoded on a background thread
+RECORD_DROP_POLICY = "drop-oldest" # when the encoder falls behind: "drop-oldest" or "drop-newest"
+DEBUG_VIEW = True             # draw the overlay for the window / recording (the governor may turn it off)
+GOVERNOR_TARGET_FPS = 20      # lower quality step by step to keep vision at this rate (0 = fixed settings)
+# cheaper settings the governor steps through, each applied on top of the values above
+QUALITY_LEVELS = [
+    {},
+    {"BLUR_KSIZE": 5},
+    {"BLUR_KSIZE": 5, "PYRAMID_LEVELS": 2},
+    {"BLUR_KSIZE": 3, "PYRAMID_LEVELS": 2, "DETECT_INTERVAL": 2},
+    {"BLUR_KSIZE": 3, "PYRAMID_LEVELS": 2, "DETECT_INTERVAL": 3, "DEBUG_VIEW": False},
+]
+BUFFER_POOL = True            # reuse preallocated images for resize/blur/HSV/masks instead of allocating per frame
+PROFILE = False               # time every stage of the loop
+PROFILE_REPORT_INTERVAL = 5.0 # seconds between live stage breakdowns (0 = only at exit)
+PROFILE_TRACE = "profile.csv" # per-frame trace written on exit (.csv or .json)
+
+PROFILER = StageProfiler(enabled=PROFILE, report_interval=PROFILE_REPORT_INTERVAL)
+# scratch images of the vision loop, allocated once per resolution
+FRAME_POOL = FramePool(enabled=BUFFER_POOL)
 
 def send_command(cmd_type, arg1, arg2, timeout=5.0):
     """
-    Send command to pico
+    Send command to pico through the background UART channel, never blocks
     
     參數:
     - cmd_type: 'A' (Arcade), 'S' (Straight), 'T' (Turn), 'E' (Exit)
     - arg1: throttle (A), distance (S), degrees (T)
     - arg2: turn (A), speed (S), speed (T)
     - timeout: Max second to run command (available for S and T)
-    """
-    
-    command_str = ""
-    if cmd_type == 'A':
-        # Arcade: A, throttle, turn
-        command_str = f"A,{arg1:.2f},{arg2:.2f}\n"
-    elif cmd_type == 'S':
-        # Straight: S, distance, speed
-        command_str = f"S,{arg1:.2f},{arg2:.2f}\n"
-    elif cmd_type == 'T':
-        # Turn: T, degrees, speed
-        command_str = f"T,{arg1:.2f},{arg2:.2f}\n"
-    elif cmd_type == 'E':
-        command_str = "E\n"
-    else:
-        print(f"Error: Unknown command type {cmd_type}")
-        return
-
-    try:
-        if uart and uart.is_open:
-            if cmd_type in ['S', 'T']:
-                uart.reset_input_buffer()
-
-            uart.write(command_str.encode('utf-8'))
-            if cmd_type == 'A':
-                # check accumulating data
-                if uart.in_waiting > 0:
-                    raw_data = uart.read(uart.in_waiting)
-                    try:
-                        msg = raw_data.decode('utf-8').strip()
-                        if msg:
-                            pass
-                            # print(f"[Pico Feedback]: {msg}")
-                    except:
-                        pass
-
-            if cmd_type in ['S', 'T']:
-                start_time = time.time()
-                
-                while (time.time() - start_time) < timeout:
-                    if uart.in_waiting:
-                        line = uart.readline().decode('utf-8', errors='ignore').strip()
-                        
-                        if "DONE" in line.upper():
-                            # print(f"Command {cmd_type} Completed.") # Debug
-                            return
-                        
-                        if "ERR" in line.upper():
-                            print(f"Warning: Robot returned error for {cmd_type}")
-                            return
-
-                    time.sleep(0.01)
-                
-                print(f"Timeout: Did not receive DONE for command {cmd_type}")
 
-    except serial.SerialTimeoutException:
-        print("UART Write Timeout")
-    except Exception as e:
-        print(f"UART Error: {e}")
+    Returns a Future for 'S' and 'T' that completes when DONE/ERR arrives, None otherwise.
+    Arcade commands are coalesced, only the newest throttle/turn pair is written.
+    """
+    if link is None:
+        return None
+    return link.send(cmd_type, arg1, arg2, timeout)
 
 # Find and connect to the UART device
-def find_uart(baudrate=115200,timeout=1,write_timeout=1):
-    ports = serial.tools.list_ports.comports()
-    for port in ports:
-        try:
-            uart = serial.Serial(port.device, baudrate, timeout=timeout, write_timeout=write_timeout)
-            time.sleep(2)  # Wait for the connection to establish
-            print(f"Connected to UART on {port.device}")
-            uart.reset_input_buffer()
-            return uart
-        except serial.SerialException:
-            continue
-    raise serial.SerialException("No UART device found")
-
-def create_color_mask(hsv_frame, color_name):
+def find_uart(baudrate=115200,timeout=1,write_timeout=1,scan_all_ports=UART_SCAN_ALL_PORTS):
+    if UART_PORT:
+        uart = serial.Serial(UART_PORT, baudrate, timeout=timeout, write_timeout=write_timeout)
+        print(f"Connected to UART on {UART_PORT}")
+        uart.reset_input_buffer()
+        return uart
+    # probes all XRP-looking ports at once and checks the controller answers
+    uart = discover_port(baudrate, timeout, write_timeout, cache_path=UART_PORT_CACHE,
+                         scan_all_ports=scan_all_ports)
+    uart.reset_input_buffer()
+    return uart
+
+def create_color_mask(hsv_frame, color_name, pool_key="mask"):
     # Creates a mask for a specific color in an HSV frame.
-    ranges = COLOR_RANGE.get(color_name.lower())
-
-    if not ranges:
-        return None
-    
-    masks = [cv2.inRange(hsv_frame, lower, upper) for (lower, upper) in ranges]
-    
-    if len(masks) > 1:
-        return cv2.bitwise_or(*masks)
-    elif masks:
-        return masks[0]
-    return None
+    # Multi-range colors (like red) come out of the compiled lookup tables in one pass,
+    # run `python vision.py` to benchmark it against plain cv2.inRange.
+    # The mask lives in FRAME_POOL's pool_key buffer, valid until the next call with that key.
+    return SEGMENTER.create_mask(hsv_frame, color_name, FRAME_POOL, pool_key)
 # here's an alternative function to create color masks for multiple ranges, more straightforward but harder to read
 """
     # Create the first mask
@@ -177,139 +187,325 @@ def get_shape_name(contour):
                 shape = "circle"
     return shape
 
+def find_target_contour(frame, window=None, color=None, shape=None):
+    """
+    Blur -> HSV -> color mask -> contours on the frame, or only inside window (x0, y0, x1, y1),
+    then picks the largest contour of the color with the shape (default TARGET_COLOR / TARGET_SHAPE).
 
-if __name__ == "__main__":
-    
-    FRAME_WIDTH = 640
-    FRAME_HEIGHT = 480
-    
-    try:
-        uart = find_uart()
-    except serial.SerialException as e:
-        print(f"error: {e}")
-        uart = None
-        # exit(1)
+    Returns (best_target_contour or None, boxes) in frame coordinates, where boxes is an
+    (N, 4) array with the x, y, w, h of every contour of the color.
+    """
+    color = color or TARGET_COLOR
+    shape = shape or TARGET_SHAPE
+    x0, y0, x1, y1 = window or (0, 0, frame.shape[1], frame.shape[0])
+    crop_shape = (y1 - y0, x1 - x0, 3)
+    blurred = cv2.GaussianBlur(frame[y0:y1, x0:x1], (BLUR_KSIZE, BLUR_KSIZE), 0, dst=FRAME_POOL.get("blur", crop_shape))
+    PROFILER.mark("blur")
+    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV, dst=FRAME_POOL.get("hsv", crop_shape))
+    PROFILER.mark("hsv")
+    mask = create_color_mask(hsv, color)
+    PROFILER.mark("mask")
+    if mask is None:
+        return None, np.empty((0, 4), dtype=np.int32)
+
+    # offset maps contours from the crop back to frame coordinates
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+    # area, bbox, extent... for all contours at once, so clutter costs array work instead of a Python loop
+    stats = contour_stats(contours)
+    PROFILER.mark("contours")
+
+    best_target_contour = None
+    max_area = 0
+    # only contours passing the vectorized area/shape checks get approximated
+    for i in select_contours(stats, MIN_TARGET_AREA, shape):
+        contour = contours[i]
+        area = stats["area"][i]
+
+        if get_shape_name(contour) == shape:
+            if area > max_area:
+                max_area = area
+                best_target_contour = contour
+    PROFILER.mark("shape")
+    return best_target_contour, stats_boxes(stats)
+
+def find_target_contour_pyramid(frame, window=None, levels=1, color=None, shape=None):
+    """
+    Same result as find_target_contour(), but the mask and candidate search run on a
+    pyrDown'ed copy. Only candidates big enough to pass MIN_TARGET_AREA are segmented
+    again and shape-classified at full resolution, inside a crop around each of them.
 
+    The returned boxes are the coarse ones scaled back up, good enough for drawing.
+    """
+    color = color or TARGET_COLOR
+    shape = shape or TARGET_SHAPE
+    x0, y0, x1, y1 = window or (0, 0, frame.shape[1], frame.shape[0])
+    scale = 2 ** levels
+    small = frame[y0:y1, x0:x1]
+    for level in range(levels):
+        height, width = small.shape[:2]
+        small = cv2.pyrDown(small, dst=FRAME_POOL.get(f"pyramid{level}", ((height + 1) // 2, (width + 1) // 2, 3)))
+    # pyrDown already smooths, a 7x7 blur at full size is about 7/scale here
+    ksize = max(BLUR_KSIZE // scale, 1) | 1
+    if ksize > 1:
+        small = cv2.GaussianBlur(small, (ksize, ksize), 0, dst=FRAME_POOL.get("pyramid_blur", small.shape))
+    PROFILER.mark("pyramid")
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV, dst=FRAME_POOL.get("pyramid_hsv", small.shape))
+    mask = create_color_mask(hsv, color, "pyramid_mask")
+    PROFILER.mark("mask")
+    if mask is None:
+        return None, np.empty((0, 4), dtype=np.int32)
+    candidates, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    stats = contour_stats(candidates)
+    PROFILER.mark("contours")
+    small_boxes = stats_boxes(stats)
+    boxes = small_boxes * scale + np.array([x0, y0, 0, 0], dtype=np.int32)
+
+    # some slack: downsampling rounds the edges of the blob off
+    min_area = 0.8 * MIN_TARGET_AREA / (scale * scale)
+    pad = 2 * scale + 4
+    best_target_contour = None
+    max_area = 0
+    for i in select_contours(stats, min_area, shape):
+        x, y, w, h = small_boxes[i].tolist()
+        crop = (max(x0 + x * scale - pad, x0), max(y0 + y * scale - pad, y0),
+                min(x0 + (x + w) * scale + pad, x1), min(y0 + (y + h) * scale + pad, y1))
+        refined, _ = find_target_contour(frame, crop, color, shape)
+        if refined is not None:
+            area = cv2.contourArea(refined)
+            if area > max_area:
+                max_area = area
+                best_target_contour = refined
+    return best_target_contour, boxes
+
+
+def draw_overlay(frame, boxes, target_box=None, roi=None):
+    """
+    Draws the debug overlay: reference lines, every contour box, the search window and
+    the target with its X/Y errors. Draws in place, so pass a copy of the camera frame;
+    detection must never run on annotated pixels.
+    """
+    height, width = frame.shape[:2]
+    frame_center_x = width // 2
+    reference_line_y = int(height * 0.8)
+
+    cv2.line(frame, (frame_center_x, 0), (frame_center_x, height), (255, 0, 0), 2)       # 垂直中線 (X Axis)
+    cv2.line(frame, (0, reference_line_y), (width, reference_line_y), (0, 255, 255), 2) # 水平目標線 (Y Axis)
+
+    for x, y, w, h in boxes.tolist():
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 1)
+    if roi is not None:
+        roi_x0, roi_y0, roi_x1, roi_y1 = roi
+        cv2.rectangle(frame, (roi_x0, roi_y0), (roi_x1 - 1, roi_y1 - 1), (128, 128, 128), 1)
+
+    if target_box is None:
+        return frame
+
+    x, y, w, h = target_box
+    object_center_x = x + w // 2
+    object_bottom_y = y + h
+    offset_x = object_center_x - frame_center_x
+    offset_y = object_bottom_y - reference_line_y
+
+    # using green thick box to highlight target
+    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 3)
+
+    # 1. coordinate you want to reach
+    base_pt = (frame_center_x, reference_line_y)
+    # 2. Corner form object to target pt
+    corner_pt = (object_center_x, reference_line_y)
+    # Object bottom
+    end_pt = (object_center_x, object_bottom_y)
+
+    # display coordinate text
+    cv2.putText(frame, f"X Error: {offset_x}", (x, y - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+    cv2.putText(frame, f"Y Error: {offset_y}", (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    # A. X axis offset
+    cv2.line(frame, base_pt, corner_pt, (255, 0, 0), 3)
+    # B. Y axis offset
+    cv2.line(frame, corner_pt, end_pt, (0, 0, 255), 3)
+    # C. hypotenuse
+    cv2.line(frame, base_pt, end_pt, (0, 255, 255), 1)
+    return frame
+
+# every color/shape of the frame in one pass, used when DETECT_ALL_TARGETS is on
+DETECTOR = TargetDetector(SEGMENTER, get_shape_name, min_area=MIN_TARGET_AREA, blur_ksize=BLUR_KSIZE)
+
+
+def apply_quality(settings):
+    """
+    QualityGovernor's apply_fn: the settings are module constants read on every frame.
+    """
+    globals().update(settings)
+    DETECTOR.blur_ksize = BLUR_KSIZE
 
-    
-    
-    # PID for Turning (Trying using pid to turn)
-    # input: offset_x (from, -960 to +960)
-    # output: turn_speed (cm/s, -MAX_SPEED_CM_S to +MAX_SPEED_CM_S)
-    # est.: 300 pixels of error -> 10 cm/s turning speed => kp = 10 / 300 = 0.033
-    turn_pid = PID(
-        Kp=0.002, Ki=0.001, Kd=0.0001, 
-        setpoint=0, 
-        output_limits=(-MAX_EFFORT, MAX_EFFORT)
-    )
-
-    # PID for Distance (visual PID)
-    # input: offset_y (pixels)
-    # output: base_speed (cm/s, -MAX_SPEED_CM_S to +MAX_SPEED_CM_S)
-    # est.: 300 pixels of error -> 15 cm/s forward speed => kp = 15 / 300 = 0.05
-    distance_pid = PID(
-        Kp=0.002, Ki=0.001, Kd=0.0001,
-        setpoint=0,
-        output_limits=(-MAX_EFFORT, MAX_EFFORT)
-    )
 
-    # --- 6.2: Initialize camera ---
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter('output.avi', fourcc, 20.0, (FRAME_WIDTH, FRAME_HEIGHT))
+# What TargetFollower.measure() saw in one frame: the target offsets plus what the overlay needs
+Measurement = namedtuple("Measurement", "timestamp found offset_x offset_y target_box boxes roi frame predicted")
+
+# What one TargetFollower.step() produced: the arcade command plus the measurement
+FollowStep = namedtuple("FollowStep", "throttle turn found offset_x offset_y target_box boxes roi frame predicted")
 
-    aligned_frames_counter = 0
-    End = False
-    while not cap.isOpened():
-        time.sleep(0.1)
-    
-    while not End:
-        ret, frame = cap.read()
-        if not ret:
-            continue
 
-        frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+class TargetFollower:
+    """
+    The per-frame half of the demo that doesn't touch hardware: find the current target,
+    turn its offsets into an arcade command with the two PIDs, and keep track of
+    alignment and of TARGET_SEQUENCE. demo.py drives it from the camera, replay.py from
+    a recording.
+
+    step() does both halves for one frame. With a ControlScheduler they run apart:
+    measure() on the vision loop, control() on the scheduler's fixed-rate thread.
+
+    A BoxTracker keeps the target between detections: detection runs every
+    DETECT_INTERVAL frames, and skipped or failed frames (up to MAX_COAST_TIME) steer on
+    the predicted box instead of spinning and resetting the PIDs.
+
+    Args:
+    - sequence: (color, shape) targets to visit in order, default TARGET_SEQUENCE
+    - time_fn: clock for the PIDs (default: simple_pid's monotonic clock), replay passes
+      the recording's timestamps so dt matches the original run
+    """
+
+    def __init__(self, sequence=None, time_fn=None):
+        pid_clock = {"time_fn": time_fn} if time_fn is not None else {}
+        self.clock = time_fn or time.monotonic
+
+        # PID for Turning (Trying using pid to turn)
+        # input: offset_x (from, -960 to +960)
+        # output: turn_speed (cm/s, -MAX_SPEED_CM_S to +MAX_SPEED_CM_S)
+        # est.: 300 pixels of error -> 10 cm/s turning speed => kp = 10 / 300 = 0.033
+        self.turn_pid = PID(
+            Kp=0.002, Ki=0.001, Kd=0.0001, 
+            setpoint=0, 
+            output_limits=(-MAX_EFFORT, MAX_EFFORT),
+            **pid_clock
+        )
+
+        # PID for Distance (visual PID)
+        # input: offset_y (pixels)
+        # output: base_speed (cm/s, -MAX_SPEED_CM_S to +MAX_SPEED_CM_S)
+        # est.: 300 pixels of error -> 15 cm/s forward speed => kp = 15 / 300 = 0.05
+        self.distance_pid = PID(
+            Kp=0.002, Ki=0.001, Kd=0.0001,
+            setpoint=0,
+            output_limits=(-MAX_EFFORT, MAX_EFFORT),
+            **pid_clock
+        )
+
+        self.roi_tracker = RoiTracker(full_search_interval=ROI_FULL_SEARCH_INTERVAL)
+        self.box_tracker = BoxTracker(max_coast=MAX_COAST_TIME)
+        self.frame_count = 0
+        self.sequence = sequence or TARGET_SEQUENCE
+        self.target_index = 0
+        self._measured_index = 0
+        self.aligned_frames_counter = 0
+        self.finished = False
+
+    def step(self, frame, timestamp=None):
+        """
+        Processes one camera frame, returns a FollowStep. Sets finished once the last
+        target of the sequence has been aligned for 10 frames.
+        """
+        measurement = self.measure(frame, timestamp)
+        throttle, turn = self.control(measurement)
+        PROFILER.mark("pid")
+        return FollowStep(throttle, turn, *measurement[1:])
+
+    def measure(self, frame, timestamp=None):
+        """
+        Vision half: finds the current target in one camera frame and returns a
+        Measurement. timestamp is the capture time (time.time(), default now).
+        Measurement.frame may be a FRAME_POOL buffer, valid until the next measure().
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self._measured_index != self.target_index:
+            # control() moved on to the next target, the old one's track is useless
+            self._measured_index = self.target_index
+            self.roi_tracker.reset()
+            self.box_tracker.reset()
+
+        # cameras that honour the requested size need no resize (and no copy) at all
+        if frame.shape[1] != FRAME_WIDTH or frame.shape[0] != FRAME_HEIGHT:
+            frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT), dst=FRAME_POOL.get("resize", (FRAME_HEIGHT, FRAME_WIDTH, 3)))
+        PROFILER.mark("resize")
         height, width, _ = frame.shape
         frame_center_x = width // 2
         reference_line_y = int(height * 0.8)
-
-        cv2.line(frame, (frame_center_x, 0), (frame_center_x, height), (255, 0, 0), 2)       # 垂直中線 (X Axis)
-        cv2.line(frame, (0, reference_line_y), (width, reference_line_y), (0, 255, 255), 2) # 水平目標線 (Y Axis)
-        
-        blurred = cv2.GaussianBlur(frame, (7, 7), 0)
-        hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-        mask = create_color_mask(hsv, TARGET_COLOR)
-
-        if mask is None: 
-            continue
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        now = self.clock()
+        self.frame_count += 1
+
+        target_box = None
+        predicted = False
+        roi = None
+        boxes = np.empty((0, 4), dtype=np.int32)
+        if DETECT_INTERVAL > 1 and self.box_tracker.active and self.frame_count % DETECT_INTERVAL:
+            # in-between frame: no detection, steer on where the target should be now
+            target_box = self.box_tracker.predict(now)
+            predicted = True
+        else:
+            # search window: full frame, or a crop around the last target while tracking
+            window = self.roi_tracker.window(width, height) if ROI_TRACKING else None
+
+            target_color, target_shape = self.sequence[self._measured_index]
+            if DETECT_ALL_TARGETS:
+                detections = DETECTOR.detect(frame, window)
+                target = detections.best(target_color, target_shape)
+                best_target_contour = target.contour if target is not None else None
+                boxes = detections.boxes()
+                PROFILER.mark("detect")
+            elif PYRAMID_LEVELS > 0:
+                best_target_contour, boxes = find_target_contour_pyramid(frame, window, PYRAMID_LEVELS, target_color, target_shape)
+            else:
+                best_target_contour, boxes = find_target_contour(frame, window, target_color, target_shape)
+
+            roi = window if ROI_TRACKING and self.roi_tracker.tracking else None
+            if best_target_contour is not None:
+                target_box = cv2.boundingRect(best_target_contour)
+            if ROI_TRACKING:
+                self.roi_tracker.update(target_box)
+            self.box_tracker.update(target_box, now)
+            if target_box is None and PREDICT_MISSES:
+                # one missed detection shouldn't throw away the PIDs' state
+                target_box = self.box_tracker.predict(now)
+                predicted = target_box is not None
 
         target_found_this_frame = False
         offset_x = 0
         offset_y = 0
-        
-        best_target_contour = None
-        max_area = 0
-        
-        for contour in contours:
-            
-            x, y, w, h = cv2.boundingRect(contour)
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 1)
-            area = cv2.contourArea(contour)
-            if area < 3500:
-                continue
-            
-            shape = get_shape_name(contour)
-            
-            if shape == TARGET_SHAPE:
-                if area > max_area:
-                    max_area = area
-                    best_target_contour = contour
-        if best_target_contour is not None:
+
+        if target_box is not None:
             target_found_this_frame = True
             
-            # get bounding box and calculate offsets
-            x, y, w, h = cv2.boundingRect(best_target_contour)
+            # calculate offsets from the (detected or predicted) bounding box
+            x, y, w, h = target_box
             object_center_x = x + w // 2
             object_bottom_y = y + h
-            
-            # using green thick box to highlight target
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 3)
 
             # calculate offsets
             offset_x = object_center_x - frame_center_x
             offset_y = object_bottom_y - reference_line_y
-            
-            # 1. coordinate you want to reach
-            base_pt = (frame_center_x, reference_line_y)
-            # 2. Corner form object to target pt
-            corner_pt = (object_center_x, reference_line_y)
-            # Object bottom
-            end_pt = (object_center_x, object_bottom_y)
-            
-            # display coordinate text
-            cv2.putText(frame, f"X Error: {offset_x}", (x, y - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-            cv2.putText(frame, f"Y Error: {offset_y}", (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)     
-            # A. X axis offset
-            cv2.line(frame, base_pt, corner_pt, (255, 0, 0), 3)
-            # B. Y axis offset
-            cv2.line(frame, corner_pt, end_pt, (0, 0, 255), 3)
-            # C. hypotenuse
-            cv2.line(frame, base_pt, end_pt, (0, 255, 255), 1)
 
+        return Measurement(timestamp, target_found_this_frame, offset_x, offset_y, target_box, boxes, roi, frame, predicted)
 
+    def control(self, measurement, fresh=True):
+        """
+        Control half: turns a Measurement into (throttle, turn) with the two PIDs and
+        tracks alignment. fresh is False when a scheduler reuses a measurement for
+        another tick, those ticks don't count towards alignment.
+        """
         throttle = 0.0
         turn = 0.0
 
-        if target_found_this_frame:
+        if measurement.found:
+            offset_x = measurement.offset_x
+            offset_y = measurement.offset_y
             # deadzone
             turn_deadzone = 40
             distance_deadzone = 20
 
-            turn = turn_pid(offset_x)
-            throttle = distance_pid(offset_y)
+            turn = self.turn_pid(offset_x)
+            throttle = self.distance_pid(offset_y)
             
             scale_factor = 1.0 - min(abs(turn) / MAX_EFFORT, 0.8)
             throttle *= scale_factor
@@ -318,41 +514,158 @@ if __name__ == "__main__":
                 turn = 0
                 throttle = 0
                 
-                aligned_frames_counter += 1
-                print(f"Aligning: {aligned_frames_counter}")
-                if aligned_frames_counter >= 10:
-                    print("Aligned! Sending 'E'")
-                    End = True
+                # only real detections count towards alignment
+                if fresh and not measurement.predicted:
+                    self.aligned_frames_counter += 1
+                    print(f"Aligning: {self.aligned_frames_counter}")
+                if self.aligned_frames_counter >= 10:
+                    if self.target_index + 1 < len(self.sequence):
+                        self.target_index += 1
+                        print(f"Aligned! Next target: {self.sequence[self.target_index]}")
+                        self.aligned_frames_counter = 0
+                        self.turn_pid.reset()
+                        self.distance_pid.reset()
+                    else:
+                        print("Aligned! Sending 'E'")
+                        self.finished = True
             else:
-                aligned_frames_counter = 0
-            send_command('A', throttle, turn)
+                self.aligned_frames_counter = 0
         else:
-            send_command('A', 0, SEARCH_TURN_EFFORT) 
-            turn_pid.reset()
-            distance_pid.reset()
-            aligned_frames_counter = 0
-            
-        
-        out.write(frame)
-        cv2.imshow("Frame", frame) # Open display for debugging
+            throttle = 0
+            turn = SEARCH_TURN_EFFORT
+            self.turn_pid.reset()
+            self.distance_pid.reset()
+            self.aligned_frames_counter = 0
+
+        return throttle, turn
+
+
+if __name__ == "__main__":
+    
+    try:
+        uart = find_uart()
+    except serial.SerialException as e:
+        print(f"error: {e}")
+        uart = None
+        # exit(1)
+    if uart is not None or UART_RECONNECT:
+        # the camera and vision loop keep running while the channel reconnects
+        # background retries stick to XRP-looking ports even with UART_SCAN_ALL_PORTS
+        reconnect = (lambda: find_uart(scan_all_ports=False)) if UART_RECONNECT else None
+        link = UartChannel(uart, max_rate_hz=UART_RATE_HZ, protocol=UART_PROTOCOL, reconnect=reconnect).start()
+
+    follower = TargetFollower()
+
+    # --- 6.2: Initialize camera ---
+    cap = open_camera(0, FRAME_WIDTH, FRAME_HEIGHT, fps=CAMERA_FPS, fourccs=CAMERA_FOURCC,
+                      buffer_size=CAMERA_BUFFER_SIZE, lock_exposure=LOCK_EXPOSURE,
+                      lock_white_balance=LOCK_WHITE_BALANCE)
+
+    # debug consumers, the overlay is only drawn when at least one is attached
+    show_window = SHOW_WINDOW and not HEADLESS
+    out = None
+    if RECORD_VIDEO and not HEADLESS:
+        # frame rate is measured from the capture timestamps, which also go to output.avi.timestamps.csv
+        out = VideoRecorder('output.avi', (FRAME_WIDTH, FRAME_HEIGHT), policy=RECORD_DROP_POLICY)
+
+    End = False
+
+    while not cap.isOpened():
+        time.sleep(0.1)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            End = True
+    # without a window there is no 'q' key, Ctrl+C stops the loop and still cleans up
+    # (installed after the camera wait, so Ctrl+C still aborts that wait)
+    def request_stop(signum, stack):
+        global End
+        End = True
+    signal.signal(signal.SIGINT, request_stop)
+
+    if THREADED_CAPTURE:
+        cap = LatestFrameReader(cap, report_drops=REPORT_DROPPED_FRAMES).start()
+
+    governor = None
+    if GOVERNOR_TARGET_FPS > 0:
+        quality_base = {key: globals()[key] for level in QUALITY_LEVELS for key in level}
+        governor = QualityGovernor(QUALITY_LEVELS, quality_base, apply_quality, target_fps=GOVERNOR_TARGET_FPS)
+
+    # fixed-rate control: vision only publishes measurements, the scheduler sends the commands
+    scheduler = None
+    if CONTROL_RATE_HZ > 0:
+        scheduler = ControlScheduler(follower.control, lambda throttle, turn: send_command('A', throttle, turn),
+                                     rate_hz=CONTROL_RATE_HZ, stale_after=MEASUREMENT_STALE_AFTER).start()
+    
+    while not End:
+        PROFILER.start_frame()
+        if THREADED_CAPTURE:
+            frame, frame_id, frame_time = cap.read_latest()
+            if frame is None:
+                continue
+        else:
+            ret, frame = cap.read()
+            frame_time = time.time()
+            if not ret:
+                continue
+        PROFILER.mark("capture")
+        work_start = time.perf_counter()
+
+        if scheduler is not None:
+            step = follower.measure(frame, frame_time)
+            scheduler.publish(step, frame_time)
+            PROFILER.mark("publish")
+        else:
+            step = follower.step(frame, frame_time)
+            send_command('A', step.throttle, step.turn)
+            PROFILER.mark("uart")
+        End = End or follower.finished
+        
+        # the command is already out, now the debug view (skipped entirely when headless)
+        if (show_window or out is not None) and DEBUG_VIEW:
+            annotated = draw_overlay(step.frame.copy(), step.boxes, step.target_box, step.roi)
+            PROFILER.mark("draw")
+            if out is not None:
+                out.write(annotated, frame_time)
+                PROFILER.mark("record")
+            if show_window:
+                cv2.imshow("Frame", annotated) # Open display for debugging
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    End = True
+                PROFILER.mark("display")
+        elif show_window:
+            # debug view switched off by the governor, keep the window responsive and 'q' working
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                End = True
+        if governor is not None:
+            # work time only: waiting for the camera isn't something lower quality can fix
+            governor.update(time.perf_counter() - work_start)
+        if link is not None:
+            # the pico's answers are collected by the reader thread, only the notable ones are shown
+            for event in link.poll_events():
+                if event.kind in ("error", "nak", "mode", "estop"):
+                    print(f"Robot: {event.text}")
+        PROFILER.end_frame()
 
     # --- 6.7: Cleanup ---
     print("Task finished. Exiting.")
+    if PROFILE:
+        PROFILER.print_breakdown()
+        PROFILER.dump(PROFILE_TRACE)
+    if scheduler is not None:
+        scheduler.stop()
     send_command('E', 0, 0)
     time.sleep(0.1)
     
     cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    if uart and uart.is_open:
-        try:
-            uart.write("E\n".encode('utf-8'))
-            time.sleep(0.1)
-        except Exception as e:
-            print(f"Error encountered: {e}")
-        finally:
-            uart.close()
-            print("UART connection closed.") 
+    if out is not None:
+        out.release()
+    if show_window:
+        cv2.destroyAllWindows()
+    if link is not None:
+        link.close()
+        link_stats = link.stats()
+        if link_stats["link_losses"] or not link_stats["connected"]:
+            print(f"UART link lost {link_stats['link_losses']} times, reconnected {link_stats['reconnects']}, "
+                  f"{link_stats['downtime']:.1f} s without a link")
+        for key, latency in link.latency_stats().items():
+            print(f"UART {key} latency (ms): p50 {latency['p50']:.1f}, p95 {latency['p95']:.1f}, "
+                  f"max {latency['max']:.1f} over {latency['count']}")
+        print("UART connection closed.") 
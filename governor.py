@@ -0,0 +1,86 @@
+import collections
+import time
+
+import numpy as np
+
+
+class QualityGovernor:
+    """
+    Trades image quality for loop rate: watches the measured per-frame work time and
+    steps through cheaper settings until the loop holds target_fps, then steps back
+    towards full quality when there is headroom again.
+
+    levels[0] is full quality, every next level is cheaper. A level is a dict of settings
+    that differ from base; apply_fn receives base updated with the level's dict. Decisions
+    use the median of the last `window` frames and wait hold_time seconds after a change.
+    Each step down measures how much faster the new level is; a step back up only happens
+    when the current rate divided by that speed-up still leaves headroom x target_fps, so
+    the governor doesn't oscillate between two levels. Every change is printed and kept
+    in `changes`.
+
+    Args:
+    - levels: list of setting dicts, cheapest last
+    - base: the full-quality values of every setting the levels touch
+    - apply_fn: called with the settings dict whenever the level changes
+    - target_fps: loop rate to hold
+    - window: frames in the rolling median
+    - headroom: fps / target_fps needed before stepping back up
+    - hold_time: seconds between changes
+    """
+
+    def __init__(self, levels, base, apply_fn, target_fps=20.0, window=30, headroom=1.2,
+                 hold_time=2.0):
+        self.levels = levels
+        self.base = base
+        self.apply_fn = apply_fn
+        self.target_fps = target_fps
+        self.headroom = headroom
+        self.hold_time = hold_time
+
+        self.level = 0
+        self.changes = []  # (time, old level, new level, fps)
+        self._samples = collections.deque(maxlen=window)
+        self._last_change = time.time()
+        self._speedup = {}          # level -> fps ratio vs. the level above it, measured on the way down
+        self._fps_before_down = None
+
+    def settings(self, level=None):
+        return {**self.base, **self.levels[self.level if level is None else level]}
+
+    def update(self, work_seconds):
+        """
+        Feeds one frame's work time (seconds, without waiting for the camera). Returns
+        True when the level changed.
+        """
+        self._samples.append(work_seconds)
+        now = time.time()
+        if len(self._samples) < self._samples.maxlen or now - self._last_change < self.hold_time:
+            return False
+
+        median = float(np.median(np.fromiter(self._samples, dtype=np.float64)))
+        fps = 1.0 / median if median > 0 else float("inf")
+        if self._fps_before_down is not None:
+            # first full window after a step down: how much did that level buy?
+            self._speedup[self.level] = max(fps / self._fps_before_down, 1.0)
+            self._fps_before_down = None
+
+        if fps < self.target_fps and self.level + 1 < len(self.levels):
+            self._fps_before_down = fps
+            self._set_level(self.level + 1, fps, now)
+            return True
+        if self.level > 0 and fps / self._speedup.get(self.level, 1.0) >= self.target_fps * self.headroom:
+            self._set_level(self.level - 1, fps, now)
+            return True
+        return False
+
+    def _set_level(self, level, fps, now):
+        old = self.level
+        self.level = level
+        self.changes.append((now, old, level, fps))
+        self._samples.clear()
+        self._last_change = now
+        direction = "down" if level > old else "up"
+        changed = {key: value for key, value in self.settings().items() if self.settings(old)[key] != value}
+        print(f"[Governor] {fps:.1f} fps vs target {self.target_fps}: quality {direction}, "
+              f"level {old} -> {level} {changed}")
+        self.apply_fn(self.settings())
@@ -0,0 +1,278 @@
+import argparse
+import os
+import select
+import threading
+import time
+
+import numpy as np
+import serial
+
+from uart_link import (CMD_SYNC, REPLY_ACK, REPLY_DONE, REPLY_ERR, REPLY_NAK, pack_reply,
+                       unescape_frame, unpack_command)
+
+try:
+    import tty
+except ImportError:  # Windows has no pty
+    tty = None
+
+
+class PicoEmulator:
+    """
+    Host-side stand-in for the XRP running Pestolink/controller.py in AUTO mode.
+
+    Opens a pseudo-terminal and answers the A/S/T/E line protocol the same way
+    handle_auto_command() does: a "Command: ..." line per command, "Done" after a
+    Straight/Turn has taken its simulated time, "Err" / "Parse Error" / "Unknown command"
+    otherwise. Like the controller it handles one line per main-loop pass and sleeps
+    loop_delay between passes, and it blocks while a Straight/Turn runs. It also speaks
+    the binary frames from uart_link.py after a "B" hello, unless ascii_only is set to
+    emulate an older controller.py.
+
+    Args:
+    - straight_speed: cm/s at effort 1.0, used to time Straight
+    - turn_rate: deg/s at effort 1.0, used to time Turn
+    - fixed_duration: if set, every Straight/Turn takes this many seconds instead
+    - baud: throttle both directions to this baud rate (10 bits per byte), None = unlimited
+    - loop_delay: the controller's time.sleep(0.01) per main-loop pass
+    - verbose: print every line received
+    - ascii_only: answer "Unknown command: B" like a controller.py without binary frames
+    """
+
+    def __init__(self, straight_speed=30.0, turn_rate=180.0, fixed_duration=None, baud=None,
+                 loop_delay=0.01, verbose=False, ascii_only=False):
+        if tty is None:
+            raise OSError("PicoEmulator needs a pseudo-terminal (Linux / macOS)")
+        self.straight_speed = straight_speed
+        self.turn_rate = turn_rate
+        self.fixed_duration = fixed_duration
+        self.baud = baud
+        self.loop_delay = loop_delay
+        self.verbose = verbose
+        self.ascii_only = ascii_only
+
+        self._master, self._slave = os.openpty()
+        # raw: no echo and no newline translation, like the pico's USB serial
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._running = False
+        self._thread = None
+        self.commands = 0
+        self.arcade_commands = 0
+        self.last_arcade = (0.0, 0.0)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="PicoEmulator", daemon=True)
+        self._thread.start()
+        self._print("System Started. Mode: AUTO (emulator)")
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _throttle(self, num_bytes):
+        if self.baud:
+            time.sleep(num_bytes * 10 / self.baud)
+
+    def _print(self, text):
+        # MicroPython's print over USB serial ends lines with \r\n
+        data = (text + "\r\n").encode('utf-8')
+        self._throttle(len(data))
+        os.write(self._master, data)
+
+    def _send_reply(self, status, seq):
+        data = pack_reply(status, seq)
+        self._throttle(len(data))
+        os.write(self._master, data)
+
+    def _run(self):
+        pending = b""
+        while self._running:
+            binary = not self.ascii_only and pending[:1] == bytes((CMD_SYNC,))
+            complete = unescape_frame(pending) is not None if binary else b"\n" in pending
+            if not complete:
+                ready, _, _ = select.select([self._master], [], [], 0.05)
+                if ready:
+                    try:
+                        data = os.read(self._master, 4096)
+                    except OSError:
+                        data = b""
+                    self._throttle(len(data))
+                    pending += data
+                    binary = not self.ascii_only and pending[:1] == bytes((CMD_SYNC,))
+            decoded = unescape_frame(pending) if binary else None
+            if decoded is not None:
+                frame, consumed = decoded
+                pending = pending[consumed:]
+                self.handle_frame(frame)
+            elif not binary and b"\n" in pending:
+                raw, pending = pending.split(b"\n", 1)
+                line = raw.decode('utf-8', errors='ignore').strip()
+                if line:
+                    if self.verbose:
+                        print(f"[Emulator] <- {line}")
+                    self.handle_command(line)
+            time.sleep(self.loop_delay)
+
+    def _simulate(self, cmd, amount, effort):
+        duration = self.fixed_duration
+        if duration is None:
+            rate = self.straight_speed if cmd == 'S' else self.turn_rate
+            duration = abs(amount) / (rate * abs(effort)) if effort else 0.0
+        # drivetrain.straight()/turn() block the whole controller loop
+        time.sleep(duration)
+
+    def handle_frame(self, frame):
+        # mirrors handle_binary_frame() in Pestolink/controller.py
+        self.commands += 1
+        command = unpack_command(frame)
+        if command is None:
+            self._send_reply(REPLY_NAK, frame[2])
+            return
+        cmd, seq, arg1, arg2 = command
+        if self.verbose:
+            print(f"[Emulator] <- frame {cmd},{arg1},{arg2} seq {seq}")
+        if cmd == 'A':
+            self.arcade_commands += 1
+            self.last_arcade = (arg1, arg2)
+            self._send_reply(REPLY_ACK, seq)
+        elif cmd == 'E':
+            self.last_arcade = (0.0, 0.0)
+            self._send_reply(REPLY_ACK, seq)
+        elif cmd in ('S', 'T'):
+            self._simulate(cmd, arg1, arg2)
+            self._send_reply(REPLY_DONE, seq)
+        else:
+            self._send_reply(REPLY_ERR, seq)
+
+    def handle_command(self, line):
+        # mirrors handle_auto_command() in Pestolink/controller.py
+        self.commands += 1
+        try:
+            parts = line.split(',')
+            cmd = parts[0].strip().upper()
+
+            if cmd == 'E':
+                self._print("Command: EXIT to Manual")
+                self.last_arcade = (0.0, 0.0)
+
+            elif cmd == 'A':
+                if len(parts) >= 3:
+                    throttle = float(parts[1])
+                    turn = float(parts[2])
+                    self._print(f"Command: Arcade T={throttle}, R={turn}")
+                    self.arcade_commands += 1
+                    self.last_arcade = (throttle, turn)
+                else:
+                    self._print("Err")
+
+            elif cmd in ('S', 'T'):
+                if len(parts) >= 3:
+                    amount = float(parts[1])
+                    effort = float(parts[2])
+                    if cmd == 'S':
+                        self._print(f"Command: Straight Dist={amount}, Effort={effort}")
+                    else:
+                        self._print(f"Command: Turn Deg={amount}, Effort={effort}")
+                    self._simulate(cmd, amount, effort)
+                    self._print("Done")
+                else:
+                    self._print("Err")
+
+            elif cmd == 'I' and not self.ascii_only:
+                self._print("XRP emulator AUTO")
+
+            elif cmd == 'B' and not self.ascii_only:
+                self._print("Binary OK")
+
+            else:
+                self._print(f"Unknown command: {cmd}")
+
+        except ValueError as e:
+            self._print(f"Parse Error: {e}")
+
+
+def load_test(port, rate_hz, duration=5.0, baud=115200):
+    """
+    Writes arcade commands at rate_hz for duration seconds and matches every
+    "Command: Arcade" echo to its send time, to see where the link starts to back up.
+    """
+    uart = serial.Serial(port, baud, timeout=0.1)
+    send_times = []
+    receive_times = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set() or len(receive_times) < len(send_times):
+            line = uart.readline()
+            if not line:
+                if done.is_set():
+                    break
+                continue
+            if line.startswith(b"Command: Arcade"):
+                receive_times.append(time.perf_counter())
+
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+
+    interval = 1.0 / rate_hz
+    start = time.perf_counter()
+    next_send = start
+    i = 0
+    while time.perf_counter() - start < duration:
+        uart.write(f"A,{(i % 100) / 100:.2f},0.10\n".encode('utf-8'))
+        send_times.append(time.perf_counter())
+        i += 1
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    done.set()
+    reader_thread.join(timeout=2.0)
+    uart.close()
+
+    echoed = len(receive_times)
+    latencies = (np.array(receive_times) - np.array(send_times[:echoed])) * 1000
+    print(f"Offered {rate_hz:.0f} cmd/s for {duration:.0f} s: sent {len(send_times)}, echoed {echoed} "
+          f"({echoed / duration:.1f} cmd/s), backlog at end {len(send_times) - echoed}")
+    if echoed:
+        print(f"Echo latency (ms): p50 {np.percentile(latencies, 50):.1f}, "
+              f"p95 {np.percentile(latencies, 95):.1f}, max {latencies.max():.1f}")
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate the XRP controller on a pseudo-terminal")
+    parser.add_argument("--baud", type=int, help="throttle the link to this baud rate")
+    parser.add_argument("--straight-speed", type=float, default=30.0, help="cm/s at effort 1.0")
+    parser.add_argument("--turn-rate", type=float, default=180.0, help="deg/s at effort 1.0")
+    parser.add_argument("--duration", type=float, help="fixed seconds for every Straight/Turn")
+    parser.add_argument("--loop-delay", type=float, default=0.01, help="controller main-loop sleep")
+    parser.add_argument("--verbose", action="store_true", help="print every received line")
+    parser.add_argument("--ascii-only", action="store_true", help="emulate a controller.py without binary frames")
+    parser.add_argument("--load-test", type=float, nargs="+", metavar="RATE",
+                        help="run arcade load tests at these command rates (cmd/s) and exit")
+    args = parser.parse_args()
+
+    emulator = PicoEmulator(args.straight_speed, args.turn_rate, args.duration, args.baud,
+                            args.loop_delay, args.verbose, args.ascii_only).start()
+    if args.load_test:
+        for rate in args.load_test:
+            load_test(emulator.port, rate, baud=args.baud or 115200)
+            # let the previous backlog drain
+            time.sleep(1.0)
+        emulator.stop()
+    else:
+        print(f"Pico emulator listening on {emulator.port} (set UART_PORT in demo.py to use it), Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(5)
+                print(f"[Emulator] {emulator.commands} commands, {emulator.arcade_commands} arcade, "
+                      f"last arcade T={emulator.last_arcade[0]}, R={emulator.last_arcade[1]}")
+        except KeyboardInterrupt:
+            emulator.stop()
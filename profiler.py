@@ -0,0 +1,112 @@
+import collections
+import csv
+import json
+import time
+
+import numpy as np
+
+
+class StageProfiler:
+    """
+    Low-overhead per-stage timing for the vision/control loop.
+
+    Call start_frame() at the top of the loop, mark(stage) right after each stage and
+    end_frame() at the bottom. mark() charges the time since the previous mark to that
+    stage (several marks of the same stage in one frame add up). Keeps the last `window`
+    frames per stage for p50/p95/p99 and a per-frame trace that dump() writes as CSV or
+    JSON. With enabled=False every call returns immediately.
+
+    Args:
+    - enabled: turn the profiler on
+    - window: frames kept for the rolling percentiles
+    - report_interval: print the live stage breakdown every N seconds (0 = never)
+    - trace_frames: most recent frames kept for dump()
+    """
+
+    def __init__(self, enabled=True, window=300, report_interval=0, trace_frames=36000):
+        self.enabled = enabled
+        self.window = window
+        self.report_interval = report_interval
+        self.stages = []
+        self._samples = {}
+        self._trace = collections.deque(maxlen=trace_frames)
+        self._current = None
+        self._frame_start = 0.0
+        self._last = 0.0
+        self._frame_count = 0
+        self._last_report = time.time()
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        self._current = {}
+        self._frame_start = self._last = time.perf_counter()
+
+    def mark(self, stage):
+        if not self.enabled or self._current is None:
+            return
+        now = time.perf_counter()
+        self._current[stage] = self._current.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def end_frame(self):
+        if not self.enabled or self._current is None:
+            return
+        total = time.perf_counter() - self._frame_start
+        self._current["total"] = total
+        for stage, seconds in self._current.items():
+            if stage not in self._samples:
+                self.stages.append(stage)
+                self._samples[stage] = collections.deque(maxlen=self.window)
+            self._samples[stage].append(seconds)
+        self._trace.append((self._frame_count, time.time(), self._current))
+        self._frame_count += 1
+        self._current = None
+
+        if self.report_interval and time.time() - self._last_report >= self.report_interval:
+            self._last_report = time.time()
+            self.print_breakdown()
+
+    def percentiles(self):
+        """
+        Returns {stage: (p50, p95, p99)} in milliseconds over the rolling window.
+        """
+        result = {}
+        for stage in self.stages:
+            p50, p95, p99 = np.percentile(np.fromiter(self._samples[stage], dtype=np.float64), (50, 95, 99))
+            result[stage] = (p50 * 1000, p95 * 1000, p99 * 1000)
+        return result
+
+    def print_breakdown(self):
+        stats = self.percentiles()
+        if not stats:
+            return
+        # "total" goes last, it is the sum of everything above
+        order = [stage for stage in self.stages if stage != "total"] + ["total"]
+        lines = [f"--- stage breakdown over last {len(self._samples['total'])} frames (ms) ---",
+                 f"{'stage':12s} {'p50':>8s} {'p95':>8s} {'p99':>8s}"]
+        for stage in order:
+            p50, p95, p99 = stats[stage]
+            lines.append(f"{stage:12s} {p50:8.2f} {p95:8.2f} {p99:8.2f}")
+        p50_total = stats["total"][0]
+        lines.append(f"~{1000 / p50_total:.1f} fps at p50" if p50_total > 0 else "")
+        print("\n".join(lines))
+
+    def dump(self, path):
+        """
+        Writes the per-frame trace, milliseconds per stage, as JSON (.json) or CSV.
+        """
+        if path.lower().endswith(".json"):
+            rows = [{"frame": frame, "time": timestamp,
+                     **{stage: round(seconds * 1000, 4) for stage, seconds in stages.items()}}
+                    for frame, timestamp, stages in self._trace]
+            with open(path, "w") as f:
+                json.dump(rows, f)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "time"] + self.stages)
+                for frame, timestamp, stages in self._trace:
+                    writer.writerow([frame, f"{timestamp:.6f}"]
+                                    + [f"{stages[stage] * 1000:.4f}" if stage in stages else "" for stage in self.stages])
+        print(f"[Profiler] wrote {len(self._trace)} frames to {path}")
@@ -0,0 +1,129 @@
+import collections
+import threading
+import time
+
+import cv2
+
+
+class VideoRecorder:
+    """
+    Encodes video on a worker thread behind a bounded queue, so recording never slows
+    down the control loop.
+
+    When the queue is full, policy "drop-oldest" throws away the oldest queued frame and
+    "drop-newest" refuses the incoming one. Every written frame's capture timestamp goes
+    to a sidecar CSV (<path>.timestamps.csv), so playback tools can recover the real,
+    variable frame rate. With fps=None the container rate is estimated from the first
+    fps_probe_frames timestamps instead of being hard-coded.
+
+    Args:
+    - path: output video file
+    - frame_size: (width, height) of the frames
+    - fps: container frame rate, or None to measure it
+    - fourcc: codec, XVID by default
+    - max_queue: frames allowed to wait for the encoder
+    - policy: "drop-oldest" or "drop-newest"
+    - fps_probe_frames: frames used to measure the rate when fps is None
+    """
+
+    POLICIES = ("drop-oldest", "drop-newest")
+
+    def __init__(self, path, frame_size, fps=None, fourcc="XVID", max_queue=30,
+                 policy="drop-oldest", fps_probe_frames=30):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown drop policy {policy}, use one of {self.POLICIES}")
+        self.path = path
+        self.frame_size = frame_size
+        self.fps = fps
+        self.fourcc = fourcc
+        self.max_queue = max_queue
+        self.policy = policy
+        # the probe frames have to fit in the queue while the writer isn't open yet
+        self.fps_probe_frames = max(2, min(fps_probe_frames, max_queue))
+
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._running = True
+        self._writer = None
+        self._timestamps = open(f"{path}.timestamps.csv", "w")
+        self._timestamps.write("frame,capture_time\n")
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.max_lag = 0.0
+        self._total_lag = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="VideoRecorder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame, timestamp=None):
+        """
+        Queues a frame captured at timestamp (time.time(), default now). Never blocks.
+        The recorder keeps a reference, so don't draw on the frame afterwards.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.frames_dropped += 1
+                if self.policy == "drop-newest":
+                    return False
+                self._queue.popleft()
+            self._queue.append((frame, timestamp))
+            self._cond.notify()
+        return True
+
+    def _open_writer(self):
+        fps = self.fps
+        if fps is None:
+            times = [timestamp for _, timestamp in list(self._queue)[:self.fps_probe_frames]]
+            span = times[-1] - times[0] if len(times) > 1 else 0
+            fps = (len(times) - 1) / span if span > 0 else 20.0
+            self.fps = round(fps, 2)
+        self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.frame_size)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # with fps=None, wait for enough frames to measure the rate (or for release())
+                while self._running and (not self._queue or (
+                        self._writer is None and self.fps is None and len(self._queue) < self.fps_probe_frames)):
+                    self._cond.wait(0.1)
+                if not self._queue:
+                    return
+                if self._writer is None:
+                    self._open_writer()
+                frame, timestamp = self._queue.popleft()
+
+            self._writer.write(frame)
+            lag = time.time() - timestamp
+            self._timestamps.write(f"{self.frames_written},{timestamp:.6f}\n")
+            self.frames_written += 1
+            self._total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            "written": self.frames_written,
+            "dropped": self.frames_dropped,
+            "queued": queued,
+            "fps": self.fps,
+            "mean_lag": self._total_lag / self.frames_written if self.frames_written else 0.0,
+            "max_lag": self.max_lag,
+        }
+
+    def release(self):
+        # finish what is queued, then close the file
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        if self._writer is not None:
+            self._writer.release()
+        self._timestamps.close()
+        stats = self.stats()
+        print(f"[Recorder] {self.path}: {stats['written']} frames at {stats['fps']} fps, "
+              f"dropped {stats['dropped']}, encoder lag mean {stats['mean_lag'] * 1000:.1f} ms, "
+              f"max {stats['max_lag'] * 1000:.1f} ms")
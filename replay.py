@@ -0,0 +1,278 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import demo
+from uart_link import UartChannel
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff')
+
+
+def iter_frames(source):
+    """
+    Yields (frame, timestamp) from a video file or a folder of images.
+
+    Video timestamps come from the recorder's <video>.timestamps.csv sidecar when there
+    is one (the real capture times), otherwise from the container (CAP_PROP_POS_MSEC).
+    Image folders are played back in name order at a nominal 30 fps.
+    """
+    if os.path.isdir(source):
+        names = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for i, name in enumerate(names):
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield frame, i / 30.0
+        return
+
+    capture_times = []
+    sidecar = f"{source}.timestamps.csv"
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            next(f)
+            capture_times = [float(line.split(",")[1]) for line in f if line.strip()]
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Cannot open video {source}")
+    try:
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index < len(capture_times):
+                yield frame, capture_times[index] - capture_times[0]
+            else:
+                yield frame, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            index += 1
+    finally:
+        cap.release()
+
+
+class FakeSerial:
+    """
+    Stands in for serial.Serial: records every line written, never has anything to read.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.is_open = True
+
+    def write(self, data):
+        self.lines.append((time.time(), data.decode('utf-8').strip()))
+        return len(data)
+
+    def readline(self):
+        time.sleep(0.05)
+        return b""
+
+    def close(self):
+        self.is_open = False
+
+
+def _rss_bytes():
+    # resident set size, Linux only; None elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _iter_looped(source, loops):
+    # plays source loops times with a continuous clock, for long-run measurements
+    offset = 0.0
+    for _ in range(loops):
+        last = 0.0
+        for frame, timestamp in iter_frames(source):
+            last = timestamp
+            yield frame, offset + timestamp
+        offset += last + 1 / 30.0
+
+
+def replay(source, paced=False, commands_path=None, profile=False, memory=False, loops=1):
+    """
+    Runs the whole demo loop (detection -> PID -> UART channel) over a recording, with a
+    fake serial port instead of the robot. The PIDs use the recording's timestamps, so
+    the command stream matches the original run whether replay is paced or not.
+
+    Args:
+    - source: video file or folder of images
+    - paced: wait for each frame's original timestamp instead of running flat out
+    - commands_path: write the issued command stream to this CSV
+    - profile: print demo.PROFILER's stage breakdown at the end
+    - memory: trace the bytes the loop allocates per frame and sample the RSS
+    - loops: play the source this many times (long-run RSS checks)
+    """
+    clock = [0.0]
+    follower = demo.TargetFollower(time_fn=lambda: clock[0])
+    fake_uart = FakeSerial()
+    channel = UartChannel(fake_uart, max_rate_hz=demo.UART_RATE_HZ).start()
+    demo.PROFILER.enabled = profile
+
+    commands = []
+    latencies = []
+    frame_bytes = []
+    rss_samples = []
+    if memory:
+        tracemalloc.start()
+    first_timestamp = None
+    start = time.perf_counter()
+    for frame, timestamp in _iter_looped(source, loops):
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        clock[0] = timestamp
+        if paced:
+            delay = (timestamp - first_timestamp) - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        if memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        demo.PROFILER.start_frame()
+        frame_start = time.perf_counter()
+        step = follower.step(frame)
+        channel.arcade(step.throttle, step.turn)
+        latencies.append(time.perf_counter() - frame_start)
+        if memory:
+            # peak over the frame = everything step() allocated, even if freed again
+            frame_bytes.append(tracemalloc.get_traced_memory()[1] - traced_before)
+            if len(commands) % 100 == 0:
+                rss_samples.append(_rss_bytes())
+        demo.PROFILER.mark("uart")
+        demo.PROFILER.end_frame()
+
+        commands.append((len(commands), timestamp, step.throttle, step.turn, step.found, step.predicted))
+        if follower.finished:
+            channel.exit()
+            break
+    elapsed = time.perf_counter() - start
+    channel.close()
+    if memory:
+        tracemalloc.stop()
+
+    if not commands:
+        print(f"No frames in {source}")
+        return commands
+
+    latencies_ms = np.array(latencies) * 1000
+    found = sum(1 for command in commands if command[4])
+    predicted = sum(1 for command in commands if command[5])
+    print(f"Frames: {len(commands)} in {elapsed:.2f} s -> {len(commands) / elapsed:.1f} fps"
+          f" ({'paced' if paced else 'as fast as possible'})")
+    print(f"Per-frame latency (ms): p50 {np.percentile(latencies_ms, 50):.2f}, "
+          f"p95 {np.percentile(latencies_ms, 95):.2f}, max {latencies_ms.max():.2f}")
+    print(f"Target found in {found}/{len(commands)} frames ({predicted} of them predicted by the tracker), "
+          f"finished: {follower.finished}")
+    print(f"Commands issued: {len(commands)}, written to UART after coalescing: {len(fake_uart.lines)}")
+    if profile:
+        demo.PROFILER.print_breakdown()
+    if memory:
+        kib = np.array(frame_bytes) / 1024
+        print(f"Allocated per frame (KiB, tracemalloc peak): mean {kib.mean():.1f}, p50 {np.percentile(kib, 50):.1f}, "
+              f"max {kib.max():.1f}   buffer pool: {'on' if demo.FRAME_POOL.enabled else 'off'}, "
+              f"{demo.FRAME_POOL.allocations} buffers, {demo.FRAME_POOL.nbytes() / 1024:.0f} KiB")
+        rss = [value for value in rss_samples if value is not None]
+        if rss:
+            print(f"RSS (MiB) every 100 frames: first {rss[0] / 2**20:.1f}, last {rss[-1] / 2**20:.1f}, "
+                  f"max {max(rss) / 2**20:.1f} over {len(rss)} samples")
+
+    if commands_path:
+        with open(commands_path, "w") as f:
+            f.write("frame,video_time,throttle,turn,found,predicted\n")
+            for index, timestamp, throttle, turn, target_found, target_predicted in commands:
+                f.write(f"{index},{timestamp:.4f},{throttle:.4f},{turn:.4f},{int(target_found)},{int(target_predicted)}\n")
+        print(f"Command stream written to {commands_path}")
+    return commands
+
+
+def _box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare_pyramid(source, levels=1):
+    """
+    Runs the full-resolution detector and the pyramid detector on every frame of source
+    and reports how often they agree and how long each takes.
+    """
+    frames = 0
+    agree = 0
+    only_full = 0
+    only_pyramid = 0
+    center_errors = []
+    ious = []
+    time_full = 0.0
+    time_pyramid = 0.0
+
+    for frame, _ in iter_frames(source):
+        frame = cv2.resize(frame, (demo.FRAME_WIDTH, demo.FRAME_HEIGHT))
+        frames += 1
+
+        start = time.perf_counter()
+        full, _ = demo.find_target_contour(frame)
+        time_full += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pyramid, _ = demo.find_target_contour_pyramid(frame, levels=levels)
+        time_pyramid += time.perf_counter() - start
+
+        if full is None and pyramid is None:
+            agree += 1
+        elif full is None:
+            only_pyramid += 1
+        elif pyramid is None:
+            only_full += 1
+        else:
+            agree += 1
+            box_full = cv2.boundingRect(full)
+            box_pyramid = cv2.boundingRect(pyramid)
+            ious.append(_box_iou(box_full, box_pyramid))
+            center_errors.append(abs((box_full[0] + box_full[2] // 2) - (box_pyramid[0] + box_pyramid[2] // 2))
+                                 + abs((box_full[1] + box_full[3]) - (box_pyramid[1] + box_pyramid[3])))
+
+    if frames == 0:
+        print(f"No frames in {source}")
+        return
+
+    print(f"Frames: {frames}, pyramid levels: {levels}")
+    print(f"Same found/not-found decision: {agree / frames:.1%} "
+          f"(only full-res found: {only_full}, only pyramid found: {only_pyramid})")
+    if ious:
+        print(f"Target box IoU: mean {sum(ious) / len(ious):.3f}, min {min(ious):.3f}")
+        print(f"Offset error (|dx| + |dy| px): mean {sum(center_errors) / len(center_errors):.2f}, "
+              f"max {max(center_errors)}")
+    print(f"Full-res: {time_full / frames * 1000:.2f} ms/frame   "
+          f"Pyramid: {time_pyramid / frames * 1000:.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded video or images through the demo loop, no camera or robot needed")
+    parser.add_argument("source", help="video file (e.g. output.avi) or folder of images")
+    parser.add_argument("--pace", action="store_true", help="play at the original frame timestamps instead of flat out")
+    parser.add_argument("--commands", metavar="CSV", help="write the command stream to this file")
+    parser.add_argument("--profile", action="store_true", help="print the per-stage time breakdown")
+    parser.add_argument("--memory", action="store_true", help="report bytes allocated per frame and RSS over the run")
+    parser.add_argument("--no-pool", action="store_true", help="turn demo's buffer pool off (to compare)")
+    parser.add_argument("--loops", type=int, default=1, help="play the source this many times")
+    parser.add_argument("--compare-pyramid", type=int, metavar="LEVELS",
+                        help="instead: compare the pyramid detector at LEVELS against the full-resolution one")
+    args = parser.parse_args()
+
+    if args.compare_pyramid is not None:
+        compare_pyramid(args.source, args.compare_pyramid)
+    else:
+        if args.no_pool:
+            demo.FRAME_POOL.enabled = False
+        replay(args.source, paced=args.pace, commands_path=args.commands, profile=args.profile,
+               memory=args.memory, loops=args.loops)
@@ -0,0 +1,872 @@
+import collections
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+import serial
+import serial.tools.list_ports
+
+# Binary protocol, switched on by sending "B\n" (see Pestolink/controller.py).
+# command frame: sync, command id, seq, int16 arg1, int16 arg2, crc8
+# reply frame:   sync, status, seq, crc8
+# On the wire every command byte after the sync that is 0x03 (Ctrl-C, which would stop
+# controller.py) or ESCAPE is sent as ESCAPE, byte ^ 0x20, so the pico keeps Ctrl-C on.
+CMD_SYNC = 0xA5
+REPLY_SYNC = 0xA6
+FRAME_FORMAT = "<BBBhhB"
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+REPLY_FORMAT = "<BBBB"
+REPLY_SIZE = struct.calcsize(REPLY_FORMAT)
+# fixed-point scale of (arg1, arg2) per command: efforts in 1/1000, cm and degrees in 1/10
+ARG_SCALES = {'A': (1000, 1000), 'S': (10, 1000), 'T': (10, 1000), 'E': (1, 1)}
+REPLY_ACK = ord('K')   # arcade / exit accepted
+REPLY_DONE = ord('D')  # straight / turn finished
+REPLY_ERR = ord('R')   # unknown command or execution error
+REPLY_NAK = ord('N')   # frame failed its CRC, nothing was executed
+ESCAPE = 0x7D
+ESCAPED_BYTES = (0x03, ESCAPE)
+
+# typed view of everything the controller sends back, see parse_feedback()
+# timestamp: host receive time (time.time()), kind: see FEEDBACK_KINDS,
+# command: the command it answers ('A', 'S', ...) if known, latency: seconds since
+# that command was written, or None
+FeedbackEvent = collections.namedtuple("FeedbackEvent", "timestamp kind command text latency")
+FEEDBACK_KINDS = ("ack", "done", "error", "nak", "binary", "identify", "mode", "estop", "text")
+_REPLY_KINDS = {REPLY_ACK: "ack", REPLY_DONE: "done", REPLY_ERR: "error", REPLY_NAK: "nak"}
+
+# USB ids of the XRP's board: Raspberry Pi vendor (RP2040 / RP2350), any product id
+PICO_USB_IDS = ((0x2E8A, None),)
+
+
+def _make_crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _make_crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def _to_int16(value):
+    return max(-32768, min(32767, int(round(value))))
+
+
+def pack_command(cmd_type, seq, arg1=0.0, arg2=0.0):
+    scale1, scale2 = ARG_SCALES[cmd_type]
+    frame = struct.pack(FRAME_FORMAT[:-1], CMD_SYNC, ord(cmd_type), seq & 0xFF,
+                        _to_int16(arg1 * scale1), _to_int16(arg2 * scale2))
+    return frame + bytes((crc8(frame),))
+
+
+def escape_frame(frame):
+    """Wire bytes of a command frame: no 0x03 after the sync byte."""
+    out = bytearray(frame[:1])
+    for byte in frame[1:]:
+        if byte in ESCAPED_BYTES:
+            out += bytes((ESCAPE, byte ^ 0x20))
+        else:
+            out.append(byte)
+    return bytes(out)
+
+
+def unescape_frame(data):
+    """
+    Decodes one escaped command frame from the start of data. Returns (frame, bytes
+    consumed), or None while data doesn't hold a whole frame yet.
+    """
+    frame = bytearray(data[:1])
+    i = 1
+    while len(frame) < FRAME_SIZE:
+        if i >= len(data):
+            return None
+        byte = data[i]
+        if byte == ESCAPE:
+            if i + 1 >= len(data):
+                return None
+            i += 1
+            byte = data[i] ^ 0x20
+        frame.append(byte)
+        i += 1
+    return bytes(frame), i
+
+
+def unpack_command(frame):
+    """
+    Returns (cmd_type, seq, arg1, arg2), or None if the frame is corrupt or unknown.
+    """
+    if len(frame) != FRAME_SIZE or frame[0] != CMD_SYNC or crc8(frame[:-1]) != frame[-1]:
+        return None
+    _, cmd_id, seq, arg1, arg2, _ = struct.unpack(FRAME_FORMAT, frame)
+    cmd_type = chr(cmd_id)
+    if cmd_type not in ARG_SCALES:
+        return None
+    scale1, scale2 = ARG_SCALES[cmd_type]
+    return cmd_type, seq, arg1 / scale1, arg2 / scale2
+
+
+def pack_reply(status, seq):
+    reply = struct.pack(REPLY_FORMAT[:-1], REPLY_SYNC, status, seq & 0xFF)
+    return reply + bytes((crc8(reply),))
+
+
+def parse_feedback(line):
+    """
+    Classifies one line printed by Pestolink/controller.py. Returns (kind, command):
+    command is the command letter the line names, or None when the line doesn't say.
+    """
+    if line.startswith("Command: "):
+        # "Command: Arcade ...", "Command: Straight ...", "Command: Turn ...", "Command: EXIT ..."
+        name = line[len("Command: "):].split(" ", 1)[0]
+        return "ack", "E" if name == "EXIT" else name[:1]
+    if line == "Done":
+        return "done", None
+    if line == "Err" or line.startswith("Parse Error") or line.startswith("Execution Error"):
+        return "error", None
+    if line.startswith("Unknown command:"):
+        return "error", line[len("Unknown command:"):].strip()[:1] or None
+    if line == "Binary OK":
+        return "binary", "B"
+    if line.startswith("XRP "):
+        return "identify", "I"
+    if line.startswith("Emergency STOP"):
+        return "estop", None
+    if line.startswith("Switching to") or line.startswith("System Started"):
+        return "mode", None
+    return "text", None
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def _complete(future, result=None, error=None):
+    # the caller owns the Future and may have cancelled it, that must not kill our threads
+    if future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def unpack_reply(reply):
+    """
+    Returns (status, seq), or None if the reply is corrupt.
+    """
+    if len(reply) != REPLY_SIZE or reply[0] != REPLY_SYNC or crc8(reply[:-1]) != reply[-1]:
+        return None
+    return reply[1], reply[2]
+
+
+class UartChannel:
+    """
+    Owns the serial port to the pico with a background writer and reader thread.
+
+    Arcade commands are coalesced: only the newest throttle/turn pair is kept, and it is
+    written at most max_rate_hz times per second. Straight/Turn return a Future that
+    completes with True on DONE, False on ERR, or raises TimeoutError, so the caller
+    never blocks on serial I/O.
+
+    With protocol="binary" the channel asks the pico for 8-byte binary frames (hello
+    "B\n", repeated every second until the pico is in AUTO mode and answers). Until the
+    pico answers "Binary OK", and for good if it answers "Unknown command: B" (older
+    controller.py), everything stays on the ASCII protocol.
+
+    The reader turns every line / reply frame from the pico into a FeedbackEvent with
+    its receive time, matched to the written command it answers (in order for ASCII,
+    by seq for binary frames). Events go to a bounded queue, read with poll_events();
+    when nobody reads it the oldest events are dropped and counted. Per command and
+    event kind the channel keeps the last latency_window latencies (write to ack,
+    write to done), see latency_stats().
+
+    With a reconnect function the link heals itself: when a read or write fails (USB
+    unplugged, pico reset) the in-flight Straight/Turn fails with ConnectionError, and
+    the reader thread calls reconnect() with exponential backoff until it returns a new
+    opened port, which is swapped in (and the binary protocol negotiated again).
+    Arcade commands are coalesced meanwhile and queued Straight/Turn are failed at once.
+    uart may be None to start disconnected. reconnects / downtime are in stats().
+
+    Args:
+    - uart: an opened serial.Serial (its read timeout bounds how fast close() returns),
+      or None to wait for reconnect() to find one
+    - max_rate_hz: max arcade command writes per second
+    - command_timeout: default seconds to wait for DONE on Straight/Turn
+    - protocol: "ascii", or "binary" to negotiate the binary frames
+    - event_queue_size: max FeedbackEvents kept for poll_events()
+    - latency_window: latencies kept per command and kind for latency_stats()
+    - reconnect: () -> opened serial.Serial, raising serial.SerialException (or returning
+      None) when the pico isn't there yet, e.g. a discover_port() wrapper; None = don't reconnect
+    - reconnect_backoff: (first, max) seconds between reconnect attempts
+    """
+
+    PROTOCOLS = ("ascii", "binary")
+
+    def __init__(self, uart, max_rate_hz=30.0, command_timeout=5.0, protocol="ascii",
+                 event_queue_size=256, latency_window=500, reconnect=None, reconnect_backoff=(0.5, 5.0)):
+        if protocol not in self.PROTOCOLS:
+            raise ValueError(f"Unknown protocol {protocol}, use one of {self.PROTOCOLS}")
+        self.uart = uart
+        self.max_rate_hz = max_rate_hz
+        self.command_timeout = command_timeout
+        self.protocol = protocol
+        self.reconnect = reconnect
+        self.reconnect_backoff = reconnect_backoff
+
+        self._cond = threading.Condition()
+        self._pending_arcade = None
+        self._queue = collections.deque()  # (cmd_type, args, future, timeout)
+        self._inflight = None              # (cmd_type, future, deadline) waiting for DONE/ERR
+        self._inflight_seq = None
+        self._seq = 0
+        self.binary = False                # binary frames agreed with the pico
+        self._negotiating = protocol == "binary"
+        self._next_hello = 0.0
+        self._rx = bytearray()
+        self._sent = collections.deque(maxlen=64)  # (cmd_type, seq or None, write time) awaiting an answer
+        self._awaiting_done = None                 # ASCII Straight/Turn acknowledged, not done yet
+        self._events = collections.deque(maxlen=event_queue_size)
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=latency_window))
+        self._last_arcade_time = 0.0
+        self._running = False
+        self._writer = None
+        self._reader = None
+        self.connected = uart is not None
+        self._down_since = None if self.connected else time.time()
+        self._backoff = reconnect_backoff[0]
+        self._next_reconnect = 0.0
+
+        self.commands_written = 0
+        self.arcade_coalesced = 0
+        self.bytes_written = 0
+        self.corrupt_replies = 0
+        self.events_received = 0
+        self.events_dropped = 0
+        self.unanswered = 0                        # written commands the pico never answered
+        self.link_losses = 0
+        self.reconnects = 0
+        self._downtime = 0.0                       # seconds without a port, not counting the current outage
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._writer = threading.Thread(target=self._write_loop, name="UartWriter", daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name="UartReader", daemon=True)
+        self._writer.start()
+        self._reader.start()
+        return self
+
+    # ---------------- public commands ----------------
+
+    def arcade(self, throttle, turn):
+        with self._cond:
+            if self._pending_arcade is not None:
+                self.arcade_coalesced += 1
+            self._pending_arcade = (throttle, turn)
+            self._cond.notify_all()
+
+    def straight(self, distance, speed, timeout=None):
+        return self._submit('S', (distance, speed), timeout)
+
+    def turn(self, degrees, speed, timeout=None):
+        return self._submit('T', (degrees, speed), timeout)
+
+    def exit(self):
+        with self._cond:
+            # a stale arcade written after E would start the robot moving again
+            self._pending_arcade = None
+            self._queue.append(('E', (0, 0), None, None))
+            self._cond.notify_all()
+
+    def send(self, cmd_type, arg1, arg2, timeout=None):
+        """
+        Generic entry point with the same arguments as send_command().
+        Returns a Future for 'S' and 'T', None otherwise.
+        """
+        if cmd_type == 'A':
+            self.arcade(arg1, arg2)
+        elif cmd_type == 'S':
+            return self.straight(arg1, arg2, timeout)
+        elif cmd_type == 'T':
+            return self.turn(arg1, arg2, timeout)
+        elif cmd_type == 'E':
+            self.exit()
+        else:
+            print(f"Error: Unknown command type {cmd_type}")
+        return None
+
+    def poll_events(self):
+        """Returns the FeedbackEvents received since the last call, oldest first."""
+        with self._cond:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def latency_stats(self):
+        """
+        Latency in ms per "<command> <kind>" (e.g. "A ack", "S done") over the last
+        latency_window events: count, p50, p95, max.
+        """
+        with self._cond:
+            samples = {key: sorted(values) for key, values in self._latencies.items() if values}
+        return {key: {"count": len(values), "p50": _percentile(values, 0.5) * 1000,
+                      "p95": _percentile(values, 0.95) * 1000, "max": values[-1] * 1000}
+                for key, values in sorted(samples.items())}
+
+    def stats(self):
+        downtime = self._downtime
+        if self._down_since is not None:
+            downtime += time.time() - self._down_since
+        return {"written": self.commands_written, "arcade_coalesced": self.arcade_coalesced,
+                "bytes_written": self.bytes_written, "binary": self.binary,
+                "corrupt_replies": self.corrupt_replies, "events": self.events_received,
+                "events_dropped": self.events_dropped, "unanswered": self.unanswered,
+                "connected": self.connected, "link_losses": self.link_losses,
+                "reconnects": self.reconnects, "downtime": downtime}
+
+    def close(self, flush_timeout=1.0):
+        # give queued commands (e.g. the final 'E') a chance to go out first
+        deadline = time.time() + flush_timeout
+        with self._cond:
+            while self._running and self._queue and time.time() < deadline:
+                self._cond.wait(0.01)
+            self._running = False
+            self._cond.notify_all()
+        for thread in (self._writer, self._reader):
+            if thread is not None:
+                thread.join(timeout=2.0)
+        self._fail_inflight(TimeoutError("UART channel closed"))
+        if self.uart is None:
+            return
+        try:
+            self.uart.close()
+        except Exception as e:
+            print(f"Error encountered: {e}")
+
+    # ---------------- internals ----------------
+
+    def _submit(self, cmd_type, args, timeout):
+        future = Future()
+        with self._cond:
+            self._queue.append((cmd_type, args, future, timeout or self.command_timeout))
+            self._cond.notify_all()
+        return future
+
+    def _fail_inflight(self, error):
+        with self._cond:
+            inflight, self._inflight = self._inflight, None
+        if inflight is not None:
+            _complete(inflight[1], error=error)
+
+    def _link_lost(self, error):
+        """Called by either thread when the port fails; the reader thread reconnects."""
+        with self._cond:
+            if not self.connected:
+                return
+            self.connected = False
+            self._down_since = time.time()
+            self._backoff = self.reconnect_backoff[0]
+            self._next_reconnect = 0.0
+            self.link_losses += 1
+            uart = self.uart
+            self._cond.notify_all()
+        print(f"UART: link lost ({error}), reconnecting in the background")
+        self._fail_inflight(ConnectionError("UART link lost"))
+        try:
+            uart.close()
+        except Exception:
+            pass
+
+    def _try_reconnect(self):
+        """One reconnect attempt once the backoff has passed. Runs on the reader thread."""
+        wait = self._next_reconnect - time.time()
+        if wait > 0:
+            time.sleep(min(wait, 0.1))
+            return
+        try:
+            uart = self.reconnect()
+            if uart is None:
+                raise serial.SerialException("no port found")
+        except (serial.SerialException, OSError) as e:
+            self._next_reconnect = time.time() + self._backoff
+            print(f"UART: reconnect failed ({e}), next try in {self._backoff:.1f} s")
+            self._backoff = min(self._backoff * 2, self.reconnect_backoff[1])
+            return
+        # the reader owns these, and the writer stays off the port until connected is set
+        self._rx.clear()
+        with self._cond:
+            self.uart = uart
+            self.binary = False
+            self._negotiating = self.protocol == "binary"
+            self._next_hello = 0.0
+            self._sent.clear()
+            self._awaiting_done = None
+            down = time.time() - self._down_since
+            self._downtime += down
+            self._down_since = None
+            if self.link_losses:
+                # not the first connection of a channel started without a port
+                self.reconnects += 1
+            self.connected = True
+            self._cond.notify_all()
+        print(f"UART: connected on {uart.port} after {down:.1f} s without a link")
+
+    def _next_item(self):
+        """Picks the next thing to write, or returns how long to wait. Called with the lock held."""
+        now = time.time()
+        if self._inflight is not None and now >= self._inflight[2]:
+            cmd_type, future, _ = self._inflight
+            self._inflight = None
+            print(f"Timeout: Did not receive DONE for command {cmd_type}")
+            _complete(future, error=TimeoutError(f"No DONE for command {cmd_type}"))
+
+        if not self.connected:
+            # motion commands can't wait for the link, 'E' and the newest arcade can
+            for item in [item for item in self._queue if item[2] is not None]:
+                self._queue.remove(item)
+                _complete(item[2], error=ConnectionError(f"UART link down, command {item[0]} not sent"))
+            return None, 0.05
+
+        if self._negotiating and now >= self._next_hello:
+            self._next_hello = now + 1.0
+            return ('B', None, None, None), 0
+
+        for i, item in enumerate(self._queue):
+            # motion commands wait for the previous one; 'E' never waits
+            if item[2] is None or self._inflight is None:
+                del self._queue[i]
+                if item[2] is not None:
+                    if not item[2].set_running_or_notify_cancel():
+                        # cancelled by the caller before it was sent, skip it
+                        return None, 0
+                    self._inflight = (item[0], item[2], now + item[3])
+                return item, 0
+
+        wait = 0.05
+        if self._inflight is not None:
+            wait = min(wait, self._inflight[2] - now)
+        elif self._pending_arcade is not None:
+            next_slot = self._last_arcade_time + 1.0 / self.max_rate_hz
+            if now >= next_slot:
+                throttle, turn = self._pending_arcade
+                self._pending_arcade = None
+                self._last_arcade_time = now
+                return ('A', (throttle, turn), None, None), 0
+            wait = min(wait, next_slot - now)
+        return None, max(wait, 0)
+
+    def _encode(self, cmd_type, args):
+        """Turns a queued command into bytes for the current protocol. Called with the lock held."""
+        if cmd_type == 'B':
+            return b"B\n"
+        if self.binary:
+            self._seq = (self._seq + 1) & 0xFF
+            return escape_frame(pack_command(cmd_type, self._seq, *args))
+        if cmd_type == 'E':
+            return b"E\n"
+        return f"{cmd_type},{args[0]:.2f},{args[1]:.2f}\n".encode('utf-8')
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                item, wait = self._next_item()
+                if item is None:
+                    self._cond.wait(wait)
+                    continue
+                self._cond.notify_all()
+                cmd_type, args, future, _ = item
+                uart = self.uart
+                payload = self._encode(cmd_type, args)
+                if future is not None:
+                    self._inflight_seq = self._seq
+                # recorded before the write so a fast answer always finds it
+                self._sent.append((cmd_type, self._seq if payload[0] == CMD_SYNC else None,
+                                   time.perf_counter()))
+
+            try:
+                uart.write(payload)
+                self.commands_written += 1
+                self.bytes_written += len(payload)
+            except serial.SerialTimeoutException:
+                print("UART Write Timeout")
+                self._fail_inflight(TimeoutError(f"Write timeout for command {cmd_type}"))
+            except Exception as e:
+                if self.reconnect is not None:
+                    self._link_lost(e)
+                    continue
+                print(f"UART Error: {e}")
+                if future is not None:
+                    self._fail_inflight(e)
+
+    def _read_loop(self):
+        while self._running:
+            if not self.connected:
+                if self.reconnect is None:
+                    time.sleep(0.1)
+                else:
+                    self._try_reconnect()
+                continue
+            try:
+                if self.binary:
+                    raw = self.uart.read(self.uart.in_waiting or 1)
+                else:
+                    raw = self.uart.readline()
+            except Exception as e:
+                if not self._running:
+                    continue
+                if self.reconnect is not None:
+                    self._link_lost(e)
+                else:
+                    print(f"UART Error: {e}")
+                    time.sleep(0.1)
+                continue
+            if not raw:
+                continue
+            if self.binary:
+                self._feed(raw)
+                continue
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if line:
+                self._handle_line(line)
+
+    def _feed(self, data):
+        """Splits the binary-mode byte stream into reply frames and plain text lines."""
+        rx = self._rx
+        rx += data
+        while rx:
+            if rx[0] == REPLY_SYNC:
+                if len(rx) < REPLY_SIZE:
+                    return
+                reply = unpack_reply(bytes(rx[:REPLY_SIZE]))
+                if reply is None:
+                    # not a real frame start, resync on the next byte
+                    self.corrupt_replies += 1
+                    del rx[0]
+                    continue
+                del rx[:REPLY_SIZE]
+                self._handle_reply(*reply)
+                continue
+            # prints on the pico (mode switches, emergency stop) still arrive as text
+            end = rx.find(b"\n")
+            sync = rx.find(bytes((REPLY_SYNC,)))
+            if end < 0 and sync < 0:
+                if len(rx) > 1024:
+                    rx.clear()
+                return
+            cut = sync if end < 0 or 0 <= sync < end else end + 1
+            line = bytes(rx[:cut]).decode('utf-8', errors='ignore').strip()
+            del rx[:cut]
+            if line:
+                self._handle_line(line)
+
+    def _match_sent(self, cmd_type=None, seq=None):
+        """
+        Takes the oldest written command answered by a reply (by seq, else by command
+        letter, else the oldest one). Commands written before it got no answer.
+        Called with the lock held.
+        """
+        for i, (sent_type, sent_seq, _) in enumerate(self._sent):
+            if seq is not None:
+                if sent_seq != seq:
+                    continue
+            elif cmd_type is not None and sent_type != cmd_type:
+                continue
+            self.unanswered += i
+            for _ in range(i):
+                self._sent.popleft()
+            return self._sent.popleft()
+        return None
+
+    def _emit(self, kind, command, text, entry, received):
+        """Queues a FeedbackEvent. Called with the lock held."""
+        latency = None
+        if entry is not None:
+            command = entry[0]
+            latency = received - entry[2]
+            self._latencies[f"{command} {kind}"].append(latency)
+        if len(self._events) == self._events.maxlen:
+            self.events_dropped += 1
+        self._events.append(FeedbackEvent(time.time(), kind, command, text, latency))
+        self.events_received += 1
+
+    def _handle_reply(self, status, seq):
+        received = time.perf_counter()
+        kind = _REPLY_KINDS.get(status, "text")
+        with self._cond:
+            self._emit(kind, None, f"reply {chr(status)} seq {seq}", self._match_sent(seq=seq), received)
+            if status == REPLY_ACK:
+                return
+            if self._inflight is None or seq != self._inflight_seq:
+                inflight = None
+            else:
+                inflight, self._inflight = self._inflight, None
+            self._cond.notify_all()
+        if inflight is None:
+            if status == REPLY_NAK:
+                print("Warning: Robot rejected a corrupted frame")
+            return
+        cmd_type, future, _ = inflight
+        if status == REPLY_DONE:
+            _complete(future, True)
+        else:
+            print(f"Warning: Robot returned error for {cmd_type}")
+            _complete(future, False)
+
+    def _handle_line(self, line):
+        received = time.perf_counter()
+        kind, command = parse_feedback(line)
+        inflight = None
+        with self._cond:
+            entry = None
+            if kind in ("ack", "binary", "identify") or (kind == "error" and command is not None):
+                entry = self._match_sent(command)
+                if kind == "ack" and command in ('S', 'T'):
+                    self._awaiting_done = entry
+            elif kind in ("done", "error"):
+                # Done / Err of a Straight/Turn after its "Command: ..." line, else an Err
+                # that answers the oldest unanswered command
+                entry, self._awaiting_done = self._awaiting_done, None
+                if entry is None and kind == "error":
+                    entry = self._match_sent()
+            self._emit(kind, command, line, entry, received)
+
+            if self._negotiating and (kind == "binary" or (kind == "error" and command == 'B')):
+                self._negotiating = False
+                self.binary = kind == "binary"
+                negotiated = True
+            else:
+                negotiated = False
+                answered = entry[0] if entry is not None else None
+                if kind == "done" or (kind == "error" and answered in (None, 'S', 'T')):
+                    inflight, self._inflight = self._inflight, None
+                    self._cond.notify_all()
+        if negotiated:
+            print("UART: binary protocol enabled" if self.binary
+                  else "UART: pico has no binary protocol, staying on ASCII")
+            return
+        if inflight is None:
+            return
+        cmd_type, future, _ = inflight
+        if kind == "done":
+            _complete(future, True)
+        else:
+            print(f"Warning: Robot returned error for {cmd_type}")
+            _complete(future, False)
+
+
+def probe_port(device, baudrate=115200, timeout=1, write_timeout=1, handshake_timeout=1.0):
+    """
+    Opens device and asks "I" (identify). Returns (uart, reply): reply is the
+    controller's answer, or None if nothing recognisable came back in time.
+    An older controller.py only answers in AUTO mode, with "Unknown command: I".
+    """
+    uart = serial.Serial(device, baudrate, timeout=0.05, write_timeout=write_timeout)
+    reply = None
+    try:
+        uart.reset_input_buffer()
+        uart.write(b"I\n")
+        deadline = time.time() + handshake_timeout
+        while reply is None and time.time() < deadline:
+            line = uart.readline().decode('utf-8', errors='ignore').strip()
+            if line.startswith("XRP ") or line == "Unknown command: I":
+                reply = line
+    except serial.SerialException:
+        uart.close()
+        raise
+    uart.timeout = timeout
+    return uart, reply
+
+
+def _matches_usb_ids(port, usb_ids):
+    return any(port.vid == vid and (pid is None or port.pid == pid) for vid, pid in usb_ids)
+
+
+def discover_port(baudrate=115200, timeout=1, write_timeout=1, usb_ids=PICO_USB_IDS,
+                  cache_path=None, handshake_timeout=1.0, scan_all_ports=False):
+    """
+    Finds the XRP's serial port and returns it opened.
+
+    The port in cache_path (last one whose controller answered) is tried first. Otherwise
+    every port matching usb_ids is probed at the same time, and the first one whose
+    controller answers the "I" handshake wins. Only if none match and scan_all_ports is
+    set are all serial ports probed, which writes "I" to unrelated devices.
+    If none answers (e.g. an older controller.py still in MANUAL mode) the first
+    matching port is used with a warning, and not cached.
+    """
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cached = f.read().strip() or None
+    if cached:
+        try:
+            uart, reply = probe_port(cached, baudrate, timeout, write_timeout, handshake_timeout)
+            if reply is not None:
+                print(f"Connected to UART on {cached} (cached, {reply})")
+                return uart
+            uart.close()
+        except serial.SerialException:
+            pass
+
+    # the cached port stays a candidate: it may be the right one with a silent controller
+    ports = serial.tools.list_ports.comports()
+    candidates = [port for port in ports if _matches_usb_ids(port, usb_ids)]
+    if not candidates and scan_all_ports:
+        candidates = ports
+    if not candidates:
+        raise serial.SerialException("No UART device found")
+
+    def probe(port):
+        try:
+            return probe_port(port.device, baudrate, timeout, write_timeout, handshake_timeout)
+        except serial.SerialException:
+            return None, None
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        results = list(pool.map(probe, candidates))
+
+    # a full "XRP <name>" answer beats an older controller's "Unknown command: I"
+    answered = sorted((not reply.startswith("XRP "), i) for i, (_, reply) in enumerate(results) if reply is not None)
+    chosen = None
+    answered_port = None
+    if answered:
+        index = answered[0][1]
+        chosen = results[index][0]
+        answered_port = candidates[index].device
+        print(f"Connected to UART on {candidates[index].device} ({results[index][1]})")
+    if chosen is None:
+        for port, (uart, reply) in zip(candidates, results):
+            if uart is not None and _matches_usb_ids(port, usb_ids):
+                chosen = uart
+                print(f"Warning: no controller answered the handshake, using {port.device} ({port.description})")
+                break
+    for uart, _ in results:
+        if uart is not None and uart is not chosen:
+            uart.close()
+    if chosen is None:
+        raise serial.SerialException(f"No XRP controller found on {', '.join(port.device for port in candidates)}")
+
+    if cache_path and answered_port is not None:
+        with open(cache_path, "w") as f:
+            f.write(answered_port)
+    return chosen
+
+
+def _wait_ascii_echo(uart, prefix):
+    while True:
+        line = uart.readline()
+        if not line:
+            return False
+        if line.startswith(prefix):
+            return True
+
+
+def _wait_binary_reply(uart, seq):
+    while True:
+        byte = uart.read(1)
+        if not byte:
+            return False
+        if byte[0] != REPLY_SYNC:
+            continue
+        reply = unpack_reply(byte + uart.read(REPLY_SIZE - 1))
+        if reply is not None and reply[1] == seq:
+            return True
+
+
+def benchmark_round_trip(uart, count=200):
+    """
+    Sends count arcade commands one at a time in each protocol and waits for the pico's
+    confirmation ("Command: Arcade ..." line or ACK frame) before sending the next one.
+    The pico has to be in AUTO mode. Also times the encode/decode work on each side.
+    """
+    import timeit
+
+    results = {}
+    uart.reset_input_buffer()
+    for protocol in ("ascii", "binary"):
+        if protocol == "binary":
+            uart.write(b"B\n")
+            if not _wait_ascii_echo(uart, b"Binary OK"):
+                print("Pico did not accept the binary protocol, skipping it")
+                break
+        latencies = []
+        lost = 0
+        for i in range(count):
+            throttle = (i % 100) / 100
+            if protocol == "ascii":
+                payload = f"A,{throttle:.2f},0.10\n".encode('utf-8')
+            else:
+                payload = escape_frame(pack_command('A', i, throttle, 0.10))
+            start = time.perf_counter()
+            uart.write(payload)
+            if protocol == "ascii":
+                ok = _wait_ascii_echo(uart, b"Command: Arcade")
+            else:
+                ok = _wait_binary_reply(uart, i & 0xFF)
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                lost += 1
+        results[protocol] = latencies
+        if latencies:
+            ms = sorted(x * 1000 for x in latencies)
+            print(f"{protocol:6s} round trip (ms): p50 {ms[len(ms) // 2]:.2f}, "
+                  f"p95 {ms[int(len(ms) * 0.95)]:.2f}, max {ms[-1]:.2f}, lost {lost}/{count}")
+
+    line = "A,0.50,0.10"
+    frame = pack_command('A', 1, 0.5, 0.1)
+    echo = f"Command: Arcade T={0.5}, R={0.1}\r\n".encode('utf-8')
+    n = 20000
+    timings = [
+        ("host encode", lambda: f"A,{0.5:.2f},{0.1:.2f}\n".encode('utf-8'), lambda: pack_command('A', 1, 0.5, 0.1)),
+        ("pico decode", lambda: [float(x) for x in line.split(',')[1:]], lambda: unpack_command(frame)),
+    ]
+    print(f"bytes per command: ascii {len(line) + 1} out / {len(echo)} back, "
+          f"binary {FRAME_SIZE}+ out / {REPLY_SIZE} back")
+    for name, ascii_fn, binary_fn in timings:
+        ascii_us = timeit.timeit(ascii_fn, number=n) / n * 1e6
+        binary_us = timeit.timeit(binary_fn, number=n) / n * 1e6
+        print(f"{name} (CPython, us): ascii {ascii_us:.2f}, binary {binary_us:.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Round-trip benchmark of the ASCII and binary UART protocols")
+    parser.add_argument("port", nargs="?", help="serial port of the pico (default: a pico_emulator pty)")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args()
+
+    emulator = None
+    port = args.port
+    if port is None:
+        from pico_emulator import PicoEmulator
+        emulator = PicoEmulator(baud=args.baud).start()
+        port = emulator.port
+        print(f"Benchmarking against the pico emulator on {port} (throttled to {args.baud} baud)")
+    uart = serial.Serial(port, args.baud, timeout=1)
+    try:
+        benchmark_round_trip(uart, args.count)
+    finally:
+        uart.close()
+        if emulator is not None:
+            emulator.stop()
@@ -0,0 +1,615 @@
+import json
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+def _ranges_signature(color_range):
+    return tuple(
+        (name, tuple((tuple(lower), tuple(upper)) for (lower, upper) in ranges))
+        for name, ranges in color_range.items()
+    )
+
+
+class ColorSegmenter:
+    """
+    Compiled HSV segmentation built from a COLOR_RANGE style dict.
+
+    Every (lower, upper) range gets one bit. A per-channel lookup table maps each H, S
+    and V value to the bits of the ranges it falls in, so one pass of lookups and ANDs
+    tells every pixel which ranges it matches. Per-color masks and a color-class label
+    image are then cheap lookups on that single bit image instead of one inRange pass
+    per range. When all ranges share the same S/V bounds (as COLOR_RANGE does) only the
+    hue needs a table and one inRange gates S/V for every color at once.
+
+    The dict is kept by reference and the tables are rebuilt automatically whenever
+    its contents change.
+    """
+
+    def __init__(self, color_range):
+        self.color_range = color_range
+        self._signature = None
+        self.class_ids = {}
+        self._build()
+
+    def _build(self):
+        signature = _ranges_signature(self.color_range)
+        num_ranges = sum(len(ranges) for _, ranges in signature)
+        if num_ranges > 31:
+            raise ValueError(f"ColorSegmenter supports up to 31 HSV ranges, got {num_ranges}")
+        # small range sets keep everything 8-bit so cv2.LUT can do the second lookup too
+        self._dtype = np.uint8 if num_ranges <= 8 else np.int32
+
+        channel_lut = np.zeros((256, 1, 3), dtype=self._dtype)
+        values = np.arange(256)
+        self._color_bits = {}
+        self.class_ids = {}
+        bit = 0
+        for class_id, (name, ranges) in enumerate(signature, start=1):
+            color_bits = 0
+            for lower, upper in ranges:
+                for channel in range(3):
+                    inside = (values >= lower[channel]) & (values <= upper[channel])
+                    channel_lut[inside, 0, channel] |= self._dtype(1 << bit)
+                color_bits |= 1 << bit
+                bit += 1
+            self._color_bits[name] = color_bits
+            self.class_ids[name] = class_id
+        self._channel_luts = [np.ascontiguousarray(channel_lut[:, 0, channel]) for channel in range(3)]
+
+        # Usual case: every range shares the same S/V bounds and only hue tells colors apart.
+        # Then the hue table alone gives the bits and one inRange gates S/V for all colors.
+        sv_bounds = {(lower[1:], upper[1:]) for _, ranges in signature for (lower, upper) in ranges}
+        self._sv_gate = None
+        self._hue_mask_luts = {}
+        if len(sv_bounds) == 1:
+            (sv_lower, sv_upper), = sv_bounds
+            self._sv_gate = ((0,) + tuple(sv_lower), (255,) + tuple(sv_upper))
+            for name, bits in self._color_bits.items():
+                self._hue_mask_luts[name] = np.where(channel_lut[:, 0, 0] & bits, 255, 0).astype(np.uint8)
+
+        if self._dtype == np.uint8:
+            patterns = np.arange(256)
+            self._mask_luts = {
+                name: np.where(patterns & bits, 255, 0).astype(np.uint8)
+                for name, bits in self._color_bits.items()
+            }
+            # first color in dict order wins where ranges overlap
+            label_lut = np.zeros(256, dtype=np.uint8)
+            for name in reversed(list(self._color_bits)):
+                label_lut[(patterns & self._color_bits[name]) != 0] = self.class_ids[name]
+            self._label_lut = label_lut
+        self._signature = signature
+
+    def _refresh(self):
+        if _ranges_signature(self.color_range) != self._signature:
+            self._build()
+
+    def classify(self, hsv_frame):
+        """
+        One pass over the frame. Returns the range-bit image used by mask()/labels().
+        """
+        self._refresh()
+        if self._sv_gate is not None:
+            bits = cv2.LUT(cv2.extractChannel(hsv_frame, 0), self._channel_luts[0])
+            gate = cv2.inRange(hsv_frame, *self._sv_gate)
+            if self._dtype == np.uint8:
+                return cv2.bitwise_and(bits, gate, dst=bits)
+            return np.where(gate != 0, bits, 0).astype(self._dtype)
+
+        h, s, v = cv2.split(hsv_frame)
+        bits = cv2.LUT(h, self._channel_luts[0])
+        bits &= cv2.LUT(s, self._channel_luts[1])
+        bits &= cv2.LUT(v, self._channel_luts[2])
+        return bits
+
+    def mask(self, bits, color_name):
+        """
+        Same output as OR-ing cv2.inRange over the color's ranges (255 inside, 0 outside).
+        """
+        color_bits = self._color_bits.get(color_name.lower())
+        if color_bits is None:
+            return None
+        if self._dtype == np.uint8:
+            return cv2.LUT(bits, self._mask_luts[color_name.lower()])
+        return np.where(bits & color_bits, 255, 0).astype(np.uint8)
+
+    def masks(self, bits):
+        return {name: self.mask(bits, name) for name in self._color_bits}
+
+    def labels(self, bits):
+        """
+        Color-class ID per pixel (see class_ids), 0 where no color matches.
+        """
+        if self._dtype == np.uint8:
+            return cv2.LUT(bits, self._label_lut)
+        labels = np.zeros(bits.shape, dtype=np.uint8)
+        for name in reversed(list(self._color_bits)):
+            labels[(bits & self._color_bits[name]) != 0] = self.class_ids[name]
+        return labels
+
+    def create_mask(self, hsv_frame, color_name, pool=None, key="mask"):
+        """
+        Drop-in replacement for create_color_mask() when only one color is needed.
+        With a FramePool the mask and its intermediates are written into the pool's
+        buffers (key names them), so the returned mask is only valid until the next call.
+        """
+        self._refresh()
+        name = color_name.lower()
+        ranges = self.color_range.get(name)
+        if not ranges:
+            return None
+        shape = hsv_frame.shape[:2]
+        dst = pool.get(key, shape) if pool is not None else None
+        if len(ranges) == 1:
+            # a single range is already one pass, nothing to gain from the tables
+            lower, upper = ranges[0]
+            return cv2.inRange(hsv_frame, lower, upper, dst=dst)
+        if self._sv_gate is not None:
+            hue = pool.get(key + "_hue", shape) if pool is not None else None
+            gate = pool.get(key + "_gate", shape) if pool is not None else None
+            mask = cv2.LUT(cv2.extractChannel(hsv_frame, 0, dst=hue), self._hue_mask_luts[name], dst=dst)
+            return cv2.bitwise_and(mask, cv2.inRange(hsv_frame, *self._sv_gate, dst=gate), dst=mask)
+        return self.mask(self.classify(hsv_frame), name)
+
+
+class FramePool:
+    """
+    Preallocated scratch images for the vision pipeline, so steady-state frames don't
+    allocate. get(name, shape) returns a contiguous view into the buffer kept for name
+    (pass it as an OpenCV dst=); the buffer only grows, so ROI crops of any size reuse
+    the full-frame buffer. Whatever was in it is overwritten by the next user of name.
+    With enabled=False get() returns None, which dst= treats as "allocate as usual".
+
+    Args:
+    - enabled: turn the pool on
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.allocations = 0
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        if not self.enabled:
+            return None
+        size = 1
+        for dim in shape:
+            size *= dim
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+        return buffer[:size].reshape(shape)
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+
+# Cheap per-contour checks that must hold (with slack) for get_shape_name() to return the
+# shape. They run on whole arrays, so only plausible contours reach polygon approximation.
+SHAPE_PREFILTERS = {
+    # circularity vs. the enclosing circle is at most the bbox-based estimate below
+    "circle": {"min_aspect": 0.55, "min_circularity": 0.5},
+    # a 1.0-1.2 square stays within ~0.8 bbox aspect at any rotation
+    "square": {"min_aspect": 0.75},
+}
+
+
+def contour_stats(contours):
+    """
+    Bulk features for a list of contours (as returned by cv2.findContours), computed on
+    all points at once instead of one OpenCV call per contour.
+
+    Returns a dict of NumPy arrays with one entry per contour: area (same as
+    cv2.contourArea), x, y, w, h (same as cv2.boundingRect), cx, cy (centroid from the
+    polygon moments), extent (area / bbox area), aspect (short / long bbox side) and
+    circularity (area / circle over the long bbox side).
+    """
+    keys = ("area", "x", "y", "w", "h", "cx", "cy", "extent", "aspect", "circularity")
+    if len(contours) == 0:
+        return {key: np.zeros(0, dtype=np.int32 if key in ("x", "y", "w", "h") else np.float64) for key in keys}
+
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=len(contours))
+    starts = np.zeros(len(contours), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    points = np.concatenate(contours).reshape(-1, 2)
+    px = points[:, 0]
+    py = points[:, 1]
+
+    x = np.minimum.reduceat(px, starts)
+    y = np.minimum.reduceat(py, starts)
+    w = np.maximum.reduceat(px, starts) - x + 1
+    h = np.maximum.reduceat(py, starts) - y + 1
+
+    # shoelace over each closed polygon: the next point of the last one is the first one
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    fx = px[following].astype(np.float64)
+    fy = py[following].astype(np.float64)
+    cross = px * fy - fx * py
+    signed_area = np.add.reduceat(cross, starts) / 2
+    area = np.abs(signed_area)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cx = np.add.reduceat((px + fx) * cross, starts) / (6 * signed_area)
+        cy = np.add.reduceat((py + fy) * cross, starts) / (6 * signed_area)
+    # degenerate (zero area) contours fall back to the bbox center
+    flat = signed_area == 0
+    cx[flat] = x[flat] + (w[flat] - 1) / 2
+    cy[flat] = y[flat] + (h[flat] - 1) / 2
+
+    long_side = np.maximum(w, h)
+    return {
+        "area": area,
+        "x": x.astype(np.int32),
+        "y": y.astype(np.int32),
+        "w": w.astype(np.int32),
+        "h": h.astype(np.int32),
+        "cx": cx,
+        "cy": cy,
+        "extent": area / (w * h),
+        "aspect": np.minimum(w, h) / long_side,
+        "circularity": area / (np.pi * (long_side / 2) ** 2),
+    }
+
+
+def select_contours(stats, min_area, shape=None):
+    """
+    Vectorized area and shape predicates on contour_stats(). Returns the indices of the
+    contours that pass, largest first.
+    """
+    keep = stats["area"] >= min_area
+    rules = SHAPE_PREFILTERS.get(shape, {})
+    if "min_aspect" in rules:
+        keep &= stats["aspect"] >= rules["min_aspect"]
+    if "min_circularity" in rules:
+        keep &= stats["circularity"] >= rules["min_circularity"]
+    index = np.flatnonzero(keep)
+    return index[np.argsort(-stats["area"][index], kind="stable")]
+
+
+def stats_boxes(stats):
+    # (N, 4) int32 array of x, y, w, h, e.g. for drawing every contour
+    return np.stack([stats["x"], stats["y"], stats["w"], stats["h"]], axis=1)
+
+
+Detection = namedtuple("Detection", "color shape bbox area centroid contour")
+
+
+class Detections(list):
+    """
+    Detections of one frame, largest first. query()/best() filter by color and/or shape.
+    """
+
+    def query(self, color=None, shape=None):
+        return [d for d in self if (color is None or d.color == color) and (shape is None or d.shape == shape)]
+
+    def best(self, color=None, shape=None):
+        matches = self.query(color, shape)
+        return matches[0] if matches else None
+
+    def boxes(self):
+        return np.array([d.bbox for d in self], dtype=np.int32).reshape(-1, 4)
+
+
+class TargetDetector:
+    """
+    Finds every (color, shape) target of a frame in one pass.
+
+    The frame is blurred and converted to HSV once, the segmenter labels every pixel
+    with its color class, and a single findContours on "any color" gives the candidate
+    regions. Only regions big enough to hold a target are split by color (inside their
+    own bbox) and shape-classified, so the cost follows the number of pixels and not
+    colors x pixels. Where color ranges overlap, the first color in COLOR_RANGE wins.
+
+    Args:
+    - segmenter: a ColorSegmenter
+    - classify_shape: function(contour) -> shape name, e.g. demo.get_shape_name
+    - min_area: ignore contours smaller than this (px²)
+    - blur_ksize: Gaussian blur kernel size (0 or 1 = no blur)
+    """
+
+    def __init__(self, segmenter, classify_shape, min_area=3500, blur_ksize=7):
+        self.segmenter = segmenter
+        self.classify_shape = classify_shape
+        self.min_area = min_area
+        self.blur_ksize = blur_ksize
+
+    def detect(self, frame, window=None):
+        """
+        Returns Detections for the frame, or only inside window (x0, y0, x1, y1).
+        Coordinates are always frame coordinates.
+        """
+        x0, y0, x1, y1 = window or (0, 0, frame.shape[1], frame.shape[0])
+        image = frame[y0:y1, x0:x1]
+        if self.blur_ksize > 1:
+            image = cv2.GaussianBlur(image, (self.blur_ksize, self.blur_ksize), 0)
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        labels = self.segmenter.labels(self.segmenter.classify(hsv))
+        names = {class_id: name for name, class_id in self.segmenter.class_ids.items()}
+
+        any_color = cv2.compare(labels, 0, cv2.CMP_GT)
+        regions, _ = cv2.findContours(any_color, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        region_stats = contour_stats(regions)
+        region_boxes = stats_boxes(region_stats)
+
+        detections = Detections()
+        # a single-color contour is never bigger than the region around it
+        for i in select_contours(region_stats, self.min_area):
+            x, y, w, h = region_boxes[i].tolist()
+            region_labels = labels[y:y + h, x:x + w]
+            # keep other regions that poke into this bbox out of it
+            inside = np.zeros((h, w), dtype=np.uint8)
+            cv2.drawContours(inside, regions, int(i), 255, cv2.FILLED, offset=(-x, -y))
+            counts = np.bincount(region_labels[inside > 0], minlength=len(names) + 1)
+
+            for class_id in np.flatnonzero(counts[1:]) + 1:
+                color_mask = cv2.compare(region_labels, int(class_id), cv2.CMP_EQ)
+                cv2.bitwise_and(color_mask, inside, dst=color_mask)
+                contours, _ = cv2.findContours(color_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                               offset=(x + x0, y + y0))
+                stats = contour_stats(contours)
+                boxes = stats_boxes(stats)
+                for j in select_contours(stats, self.min_area):
+                    detections.append(Detection(
+                        color=names[int(class_id)],
+                        shape=self.classify_shape(contours[j]),
+                        bbox=tuple(boxes[j].tolist()),
+                        area=float(stats["area"][j]),
+                        centroid=(float(stats["cx"][j]), float(stats["cy"][j])),
+                        contour=contours[j],
+                    ))
+
+        detections.sort(key=lambda d: d.area, reverse=True)
+        return detections
+
+
+class RoiTracker:
+    """
+    Keeps a search window around the last target so locked-on frames only process a crop.
+
+    window() returns the full frame when there is no target yet, after the target is
+    lost, or every full_search_interval frames so new / bigger targets are not missed.
+    Pass the crop's (x0, y0) as findContours' offset so contours stay in frame coordinates.
+
+    Args:
+    - margin: how much to grow the last bounding box on each side, as a fraction of its size
+    - min_margin: minimum growth in pixels, so small or fast targets stay inside the window
+    - full_search_interval: force a full-frame search every N frames (0 disables)
+    """
+
+    def __init__(self, margin=0.5, min_margin=40, full_search_interval=30):
+        self.margin = margin
+        self.min_margin = min_margin
+        self.full_search_interval = full_search_interval
+        self._bbox = None
+        self._window = None
+        self._frame_size = None
+        self._frames_since_full = 0
+
+    def window(self, width, height):
+        """
+        Returns (x0, y0, x1, y1) to process this frame.
+        """
+        self._frame_size = (width, height)
+        due = self.full_search_interval and self._frames_since_full >= self.full_search_interval
+        if self._bbox is None or due:
+            self._frames_since_full = 0
+            self._window = (0, 0, width, height)
+            return self._window
+
+        self._frames_since_full += 1
+        x, y, w, h = self._bbox
+        grow_x = max(int(w * self.margin), self.min_margin)
+        grow_y = max(int(h * self.margin), self.min_margin)
+        self._window = (max(x - grow_x, 0), max(y - grow_y, 0),
+                        min(x + w + grow_x, width), min(y + h + grow_y, height))
+        return self._window
+
+    @property
+    def tracking(self):
+        # True when the last window() was a crop rather than the full frame
+        return self._window is not None and self._window != (0, 0) + self._frame_size
+
+    def update(self, bbox):
+        """
+        bbox: (x, y, w, h) of the target in frame coordinates, or None when it was not found.
+        """
+        if bbox is not None and self._window is not None:
+            x0, y0, x1, y1 = self._window
+            x, y, w, h = bbox
+            # clipped by the window (not the frame): the crop cut the target, so look again
+            touches = ((x <= x0 and x0 > 0) or (y <= y0 and y0 > 0)
+                       or (x + w >= x1 and x1 < self._frame_size[0])
+                       or (y + h >= y1 and y1 < self._frame_size[1]))
+            if touches:
+                bbox = None
+        self._bbox = bbox
+
+    def reset(self):
+        self._bbox = None
+
+
+class BoxTracker:
+    """
+    Constant-velocity alpha-beta filter on the target's bounding box (center and size).
+
+    update() corrects the state with each detection, predict() extrapolates it to any
+    time, so frames where detection was skipped or failed still get an estimate. A
+    track lives max_coast seconds without a measurement; a detection too far from the
+    prediction (more than gate box sizes) restarts the track instead of being smoothed in.
+
+    Args:
+    - alpha: position gain, 1.0 = trust every measurement fully
+    - beta: velocity gain
+    - max_coast: seconds the track survives without a detection
+    - gate: jump distance, in box sizes, that counts as a different target
+    """
+
+    def __init__(self, alpha=0.85, beta=0.3, max_coast=0.5, gate=1.5):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_coast = max_coast
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self._state = None      # cx, cy, w, h
+        self._velocity = None   # per second
+        self._time = 0.0        # time of the last measurement
+
+    @property
+    def active(self):
+        return self._state is not None
+
+    def predict(self, t):
+        """
+        Returns the (x, y, w, h) box expected at time t, or None without a track.
+        """
+        if self._state is None:
+            return None
+        cx, cy, w, h = self._state + self._velocity * (t - self._time)
+        w = max(w, 1.0)
+        h = max(h, 1.0)
+        return int(cx - w / 2), int(cy - h / 2), int(w), int(h)
+
+    def update(self, bbox, t):
+        """
+        bbox: (x, y, w, h) detected at time t, or None when detection failed.
+        """
+        if bbox is None:
+            if self._state is not None and t - self._time > self.max_coast:
+                self.reset()
+            return
+
+        x, y, w, h = bbox
+        measured = np.array((x + w / 2, y + h / 2, w, h), dtype=np.float64)
+        dt = t - self._time
+        if self._state is None or dt <= 0:
+            self._state = measured
+            self._velocity = np.zeros(4)
+            self._time = t
+            return
+
+        predicted = self._state + self._velocity * dt
+        residual = measured - predicted
+        if max(abs(residual[0]), abs(residual[1])) > self.gate * max(w, h, predicted[2], predicted[3]):
+            self._state = measured
+            self._velocity = np.zeros(4)
+        else:
+            self._state = predicted + self.alpha * residual
+            self._velocity = self._velocity + self.beta * residual / dt
+        self._time = t
+
+
+def hsv_ranges_from_pixels(hsv_pixels, low=2, high=98, hue_margin=4, sv_margin=15):
+    """
+    Derives COLOR_RANGE style [(lower, upper), ...] ranges from sampled HSV pixels.
+
+    Each channel takes the low..high percentiles, so a few stray pixels don't widen the
+    range, plus a margin. Hue is circular (0..179): percentiles are taken around the
+    circular mean, and a range crossing 0/180 is split in two, like "red".
+
+    Args:
+    - hsv_pixels: (..., 3) uint8 HSV pixels, e.g. the HSV of a dragged region
+    - low, high: percentiles kept on each channel
+    - hue_margin, sv_margin: padding added on each side of the hue and S/V ranges
+    """
+    pixels = np.asarray(hsv_pixels).reshape(-1, 3).astype(np.float64)
+    hue = pixels[:, 0]
+    angles = hue * (2 * np.pi / 180)
+    # arctan2 gives -90..90 in hue units, back to 0..179
+    mean = (np.arctan2(np.sin(angles).mean(), np.cos(angles).mean()) * 180 / (2 * np.pi)) % 180
+    # hue as a signed distance from the mean, so wrap-around doesn't split the cluster
+    delta = (hue - mean + 90) % 180 - 90
+    d_low, d_high = np.percentile(delta, (low, high))
+    hue_low = int(np.floor(mean + d_low - hue_margin))
+    hue_high = int(np.ceil(mean + d_high + hue_margin))
+
+    s_low, s_high = np.percentile(pixels[:, 1], (low, high))
+    v_low, v_high = np.percentile(pixels[:, 2], (low, high))
+    s_low, s_high = int(max(s_low - sv_margin, 0)), int(min(s_high + sv_margin, 255))
+    v_low, v_high = int(max(v_low - sv_margin, 0)), int(min(v_high + sv_margin, 255))
+
+    if hue_high - hue_low >= 179:
+        hue_spans = [(0, 180)]
+    elif hue_low < 0:
+        hue_spans = [(0, hue_high), (180 + hue_low, 180)]
+    elif hue_high > 180:
+        hue_spans = [(0, hue_high - 180), (hue_low, 180)]
+    else:
+        hue_spans = [(hue_low, hue_high)]
+    return [((h_low, s_low, v_low), (h_high, s_high, v_high)) for h_low, h_high in hue_spans]
+
+
+def load_color_profiles(path):
+    """
+    Reads the named color profiles saved by color_picker.py, {} if there is no file.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        profiles = json.load(f)
+    return {name: [(tuple(lower), tuple(upper)) for lower, upper in ranges] for name, ranges in profiles.items()}
+
+
+def save_color_profile(path, name, ranges):
+    """
+    Adds or replaces one named color profile in the file at path.
+    """
+    profiles = load_color_profiles(path)
+    profiles[name] = ranges
+    # one color per line, so the file stays easy to read and diff
+    lines = [f"  {json.dumps(key)}: {json.dumps([[list(lower), list(upper)] for lower, upper in value])}"
+             for key, value in profiles.items()]
+    with open(path, "w") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+def benchmark_segmentation(color_range, sizes=((640, 480), (1280, 720)), repeats=200):
+    """
+    Compares ColorSegmenter against the per-range cv2.inRange masks on random frames.
+    """
+    def inrange_mask(hsv_frame, color_name):
+        masks = [cv2.inRange(hsv_frame, lower, upper) for (lower, upper) in color_range[color_name]]
+        mask = masks[0]
+        for extra in masks[1:]:
+            mask = cv2.bitwise_or(mask, extra)
+        return mask
+
+    segmenter = ColorSegmenter(color_range)
+    rng = np.random.default_rng(0)
+    for width, height in sizes:
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+        for name in color_range:
+            if not np.array_equal(segmenter.create_mask(hsv, name), inrange_mask(hsv, name)):
+                print(f"[{width}x{height}] mask mismatch for {name}")
+
+        cases = [(f"{name} only", lambda name=name: inrange_mask(hsv, name),
+                  lambda name=name: segmenter.create_mask(hsv, name)) for name in color_range]
+        cases += [
+            ("all color masks", lambda: [inrange_mask(hsv, name) for name in color_range],
+             lambda: segmenter.masks(segmenter.classify(hsv))),
+            ("label image", lambda: [inrange_mask(hsv, name) for name in color_range],
+             lambda: segmenter.labels(segmenter.classify(hsv))),
+        ]
+        for label, baseline, compiled in cases:
+            results = []
+            for func in (baseline, compiled):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    func()
+                results.append((time.perf_counter() - start) / repeats * 1000)
+            print(f"[{width}x{height}] {label:16s} inRange: {results[0]:.3f} ms   LUT: {results[1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    from demo import COLOR_RANGE
+
+    benchmark_segmentation(COLOR_RANGE)